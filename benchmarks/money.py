@@ -0,0 +1,29 @@
+import timeit
+
+from components import FastMoney, CheckedMoney
+
+OPERATIONS = {
+    "create": "Money(150)",
+    "add": "a + b",
+    "subtract": "a - b",
+    "multiply": "a.multiply(0.9)",
+    "compare": "a < b",
+    "split": "a.split()",
+}
+
+
+def benchmark(money_class, number):
+    results = {}
+    for name, statement in OPERATIONS.items():
+        namespace = {"Money": money_class, "a": money_class(150), "b": money_class(42)}
+        results[name] = min(timeit.repeat(statement, globals=namespace, number=number, repeat=5)) / number
+    return results
+
+
+if __name__ == '__main__':
+    number = 100000
+    checked = benchmark(CheckedMoney, number)
+    fast = benchmark(FastMoney, number)
+    print(f"{'operation':<10} {'checked':>12} {'fast':>12} {'speedup':>8}")
+    for name in OPERATIONS:
+        print(f"{name:<10} {checked[name] * 1e9:>10.0f}ns {fast[name] * 1e9:>10.0f}ns {checked[name] / fast[name]:>7.1f}x")
@@ -0,0 +1,70 @@
+import argparse
+import gc
+import time
+from functools import partial
+
+from log import log
+from main import init, createManyEntities, MANY_ENTITIES_AGENTS
+
+# capacity of the order pool, 0 creates and deletes order entities every tick like before pooling
+VARIANTS = {"pooled": None, "not pooled": 0}
+
+
+class GcWatch:
+    # collections and time spent in the garbage collector while it is installed
+    def __init__(self):
+        self.collections = [0, 0, 0]
+        self.seconds = 0.0
+        self.started = None
+
+    def __call__(self, phase, info):
+        if phase == "start":
+            self.started = time.perf_counter()
+        else:
+            self.collections[info["generation"]] += 1
+            self.seconds += time.perf_counter() - self.started
+
+
+def benchmark(agents: int, ticks: int, order_pool_capacity, seed: int = 0):
+    world = init(partial(createManyEntities, scale=agents / MANY_ENTITIES_AGENTS), ticker_path=None, seed=seed,
+                 order_pool_capacity=order_pool_capacity)
+    # first tick creates the orders which are reused later
+    world.process()
+    first_entity = world._next_entity_id
+    watch = GcWatch()
+    gc.collect()
+    gc.callbacks.append(watch)
+    start = time.perf_counter()
+    try:
+        for _ in range(ticks):
+            world.process()
+    finally:
+        gc.callbacks.remove(watch)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds_per_tick": elapsed / ticks,
+        "new_entities_per_tick": (world._next_entity_id - first_entity) / ticks,
+        # a young collection runs after every 700 new container objects (gc threshold), so it counts allocations
+        "collections_per_tick": [collections / ticks for collections in watch.collections],
+        "gc_ms_per_tick": watch.seconds / ticks * 1000,
+    }
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description="Compares ticks of the 'many' scenario with and without reusing "
+                                                 "order entities.")
+    parser.add_argument("--agents", type=int, default=10000)
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(arguments)
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    log.setLevel("ERROR")
+    print(f"{'variant':<12} {'ms/tick':>9} {'new ids/tick':>13} {'gc gen0/1/2 per tick':>22} {'gc ms/tick':>11}")
+    for name, capacity in VARIANTS.items():
+        result = benchmark(arguments.agents, arguments.ticks, capacity, arguments.seed)
+        collections = "/".join(f"{c:.1f}" for c in result["collections_per_tick"])
+        print(f"{name:<12} {result['seconds_per_tick'] * 1000:>9.1f} {result['new_entities_per_tick']:>13.1f} "
+              f"{collections:>22} {result['gc_ms_per_tick']:>11.2f}")
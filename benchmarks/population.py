@@ -0,0 +1,78 @@
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from functools import partial
+
+from components import Details, InheritancePool
+from log import log
+from main import init, createManyEntities, MANY_ENTITIES_AGENTS
+from runner import run_batch
+
+
+def benchmark(agents: int, ticks: int, budget: float, seed=None):
+    tracemalloc.start()
+    world = init(partial(createManyEntities, scale=agents / MANY_ENTITIES_AGENTS), ticker_path=None, seed=seed)
+    # ticks are not traced, tracing would slow them down; peak memory of the whole process only ever grows, so it
+    # would show the biggest of all sizes run so far
+    world_memory, creation_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # entities with details are the ones the scenario created and the inheritance pool, rounding of the scale can
+    # make them a few more or less than asked for
+    created = len(world.get_component(Details)) - len(world.get_component(InheritancePool))
+
+    report = run_batch(world, ticks, budget)
+    return {
+        "agents": created,
+        "ticks": report.ticks,
+        "seconds": report.elapsed,
+        "ticks_per_second": report.ticks_per_second(),
+        "bytes_per_agent": world_memory / created,
+        "creation_peak_bytes": creation_peak,
+        "seconds_per_tick": {phase: spent / max(report.ticks, 1) for phase, spent in report.phase_times.items()},
+    }
+
+
+def print_results(results, baseline=None):
+    baseline_sizes = {size["agents"]: size for size in baseline["sizes"]} if baseline else {}
+    for size in results["sizes"]:
+        compared = ""
+        if size["agents"] in baseline_sizes:
+            compared = f" ({size['ticks_per_second'] / baseline_sizes[size['agents']]['ticks_per_second']:.2f}x baseline)"
+        print(f"{size['agents']} agents: {size['ticks_per_second']:.3f} ticks/s{compared}, "
+              f"{size['bytes_per_agent']:.0f} bytes/agent")
+        for phase, spent in sorted(size["seconds_per_tick"].items(), key=lambda p: -p[1]):
+            print(f"  {phase:<24} {spent * 1000:>10.2f} ms/tick")
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description="Times every processor for worlds of growing population, entities "
+                                                 "keep the ratios of the 'many' scenario.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000], help="agents in a world")
+    parser.add_argument("--ticks", type=int, default=20, help="ticks to run for every size")
+    parser.add_argument("--budget", type=float, default=600, help="seconds after which a size stops early")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="population.json", help="where to save results")
+    parser.add_argument("--compare", help="results of an earlier run to compare with")
+    return parser.parse_args(arguments)
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    log.setLevel("WARNING")
+    results = {
+        "python": platform.python_version(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": arguments.seed,
+        "sizes": [],
+    }
+    for agents in arguments.sizes:
+        results["sizes"].append(benchmark(agents, arguments.ticks, arguments.budget, arguments.seed))
+        with open(arguments.output, "w") as output:
+            json.dump(results, output, indent=2)
+    baseline = None
+    if arguments.compare:
+        with open(arguments.compare) as compared:
+            baseline = json.load(compared)
+    print_results(results, baseline)
@@ -0,0 +1,129 @@
+from collections import defaultdict
+from operator import itemgetter
+from typing import Any, Dict, List, Set, Tuple
+
+import esper  # type: ignore
+
+
+class CachedWorld(esper.World):
+    # Results of get_component and get_components are kept for every signature (tuple of component types) until a
+    # component of one of its types is added to or removed from some entity. esper itself forgets all results on
+    # every change, and keeps them in a cache shared by all worlds. Results are in order of entity ids, order of the
+    # component sets depends on their history and changes when a world is restored from a checkpoint.
+    # Processors can also queue changes with add_later and delete_later, they are applied together by
+    # flush (the Flush processor) or together with dead entities at the start of the next tick.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._views: Dict[Tuple[type, ...], List] = {}
+        self._views_of_type: Dict[type, Set[Tuple[type, ...]]] = {}
+        self._added: List[Tuple[int, Any]] = []
+        self._deleted: Set[int] = set()
+
+    def clear_cache(self) -> None:
+        self._views.clear()
+        self._views_of_type.clear()
+
+    def invalidate(self, component_type: type):
+        for signature in self._views_of_type.pop(component_type, ()):
+            self._views.pop(signature, None)
+
+    def view(self, signature: Tuple[type, ...], query) -> List:
+        if signature not in self._views:
+            self._views[signature] = sorted(query, key=itemgetter(0))
+            for component_type in signature:
+                self._views_of_type.setdefault(component_type, set()).add(signature)
+        return self._views[signature]
+
+    def get_component(self, component_type):
+        return self.view((component_type,), self._get_component(component_type))
+
+    def get_components(self, *component_types):
+        return self.view(component_types, self._get_components(*component_types))
+
+    def add_component(self, entity: int, component_instance) -> None:
+        component_type = type(component_instance)
+        if component_type not in self._components:
+            self._components[component_type] = set()
+        self._components[component_type].add(entity)
+        if entity not in self._entities:
+            self._entities[entity] = {}
+        self._entities[entity][component_type] = component_instance
+        # a replaced component changes the view as well
+        self.invalidate(component_type)
+
+    def remove_component(self, entity: int, component_type) -> int:
+        self._components[component_type].discard(entity)
+        if not self._components[component_type]:
+            del self._components[component_type]
+        del self._entities[entity][component_type]
+        if not self._entities[entity]:
+            del self._entities[entity]
+        self.invalidate(component_type)
+        return entity
+
+    def add_later(self, entity: int, component_instance):
+        self._added.append((entity, component_instance))
+
+    def delete_later(self, entity: int):
+        self._deleted.add(entity)
+
+    def flush(self):
+        # queued adds go first, then deletes, every touched view is forgotten once. Like deferred deletes of esper,
+        # queued deletes of what is already gone are skipped.
+        changed = set()
+        entities, components = self._entities, self._components
+        for entity, component_instance in self._added:
+            component_type = type(component_instance)
+            if component_type not in components:
+                components[component_type] = set()
+            components[component_type].add(entity)
+            if entity not in entities:
+                entities[entity] = {}
+            entities[entity][component_type] = component_instance
+            changed.add(component_type)
+        self._delete_entities(self._deleted)
+        for component_type in changed:
+            self.invalidate(component_type)
+        self._added, self._deleted = [], set()
+
+    def delete_entity(self, entity: int, immediate=False) -> None:
+        if immediate:
+            if entity not in self._entities:
+                raise KeyError(entity)
+            self._delete_entities([entity])
+        else:
+            self._dead_entities.add(entity)
+
+    def _clear_dead_entities(self):
+        self.flush()
+        self._delete_entities(self._dead_entities)
+        self._dead_entities.clear()
+
+    def _delete_entities(self, entities):
+        # entities are taken out of every component set at once, ones deleted before are skipped
+        deleted = defaultdict(list)
+        for entity in entities:
+            for component_type in self._entities.pop(entity, ()):
+                deleted[component_type].append(entity)
+        for component_type, of_type in deleted.items():
+            self._components[component_type].difference_update(of_type)
+            if not self._components[component_type]:
+                del self._components[component_type]
+            self.invalidate(component_type)
+
+
+def add_later(world: esper.World, entity: int, component_instance):
+    # worlds without a command buffer add right away
+    if isinstance(world, CachedWorld):
+        world.add_later(entity, component_instance)
+    else:
+        world.add_component(entity, component_instance)
+
+
+
+def delete_later(world: esper.World, entity: int):
+    # worlds without a command buffer delete at the start of the next tick, like the queue is flushed
+    if isinstance(world, CachedWorld):
+        world.delete_later(entity)
+    else:
+        world.delete_entity(entity)
@@ -0,0 +1,206 @@
+import gc
+import os
+import pickle
+import zlib
+from array import array
+from collections import defaultdict
+from contextlib import contextmanager
+from enum import Enum
+from itertools import accumulate
+from operator import attrgetter
+from typing import Dict, List, Optional
+
+import esper  # type: ignore
+from sortedcontainers import SortedKeyList  # type: ignore
+
+from components import Money, FastMoney, CheckedMoney
+
+MAGIC = b"SBCP"
+# version 2: storage keeps resources in arrays, 3: needs point to shared profiles
+VERSION = 3
+
+
+# Checkpoints keep every component type as columns: entity ids and one column per attribute. Attributes holding
+# numbers, money, enums, tuples, lists, dicts, arrays and plain objects (with __dict__ or __slots__) are split into
+# columns of their own, down to arrays of numbers, so that millions of small objects are not pickled one by one. Anything else is pickled as it is.
+def save(world: esper.World, path: str, compression: int = 1):
+    with gc_paused():
+        save_world(world, path, compression)
+
+
+def load(world: esper.World, path: str) -> esper.World:
+    # replaces all entities of the world with the ones from the checkpoint, processors stay
+    with gc_paused():
+        return load_world(world, path)
+
+
+@contextmanager
+def gc_paused():
+    # garbage collector would scan all objects over and over again while millions of new ones are created
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def save_world(world: esper.World, path: str, compression: int):
+    # deleted entities would come back to life after restoring
+    world._clear_dead_entities()
+    components: Dict[type, List] = defaultdict(list)
+    for ent, entity_components in world._entities.items():
+        for component_type, component in entity_components.items():
+            components[component_type].append((ent, component))
+
+    columns = {component_type: (array("q", [ent for ent, _ in entities]), encode_column([c for _, c in entities]))
+               for component_type, entities in components.items()}
+    data = zlib.compress(pickle.dumps({"next_entity_id": world._next_entity_id, "components": columns},
+                                      protocol=pickle.HIGHEST_PROTOCOL), compression)
+    # checkpoint is replaced only when the new one is complete
+    with open(f"{path}.tmp", "wb") as output:
+        output.write(MAGIC + bytes([VERSION]) + data)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_world(world: esper.World, path: str) -> esper.World:
+    with open(path, "rb") as saved:
+        header = saved.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise Exception(f"{path} is not a checkpoint")
+        if header[len(MAGIC)] != VERSION:
+            raise Exception(f"Checkpoint {path} has version {header[len(MAGIC)]}, only version {VERSION} can be loaded")
+        checkpoint = pickle.loads(zlib.decompress(saved.read()))
+
+    world.clear_database()
+    # components are put directly into the database, adding them one by one would clear the query cache every time
+    for component_type, (entities, column) in checkpoint["components"].items():
+        world._components[component_type] = set(entities)
+        for ent, component in zip(entities, decode_column(column, len(entities))):
+            if ent not in world._entities:
+                world._entities[ent] = {}
+            world._entities[ent][component_type] = component
+    world._next_entity_id = checkpoint["next_entity_id"]
+    world.clear_cache()
+    return world
+
+
+def slot_names(value_type: type) -> List[str]:
+    return [name for cls in value_type.__mro__ for name in cls.__dict__.get("__slots__", ())]
+
+
+def plain_attributes(values) -> Optional[Dict[str, List]]:
+    # columns of attributes of plain objects, None if values are not plain objects with the same attributes
+    value_type = type(values[0])
+    # classes have a __dict__ too, but they are pickled by name
+    if isinstance(values[0], type) or value_type.__reduce__ is not object.__reduce__ or \
+            value_type.__reduce_ex__ is not object.__reduce_ex__:
+        return None
+    if not hasattr(values[0], "__dict__"):
+        names = slot_names(value_type)
+        if len(names) == 0:
+            return None
+        try:
+            return {name: list(map(attrgetter(name), values)) for name in names}
+        except AttributeError:
+            # some slot is not set
+            return None
+    attributes = vars(values[0]).keys()
+    if not all(vars(v).keys() == attributes for v in values):
+        return None
+    dicts = [vars(v) for v in values]
+    return {name: [d[name] for d in dicts] for name in attributes}
+
+
+def encode_column(values: List):
+    if len(values) == 0:
+        return "objects", values
+    # checked and fast money (or a mix of them) come back as the implementation chosen for the loading run
+    if all(isinstance(v, (FastMoney, CheckedMoney)) for v in values):
+        return "money", array("q", [v.creds for v in values])
+    value_type = type(values[0])
+    if not all(type(v) is value_type for v in values):
+        return "objects", values
+    if value_type is int:
+        try:
+            return "int", array("q", values)
+        except OverflowError:
+            return "objects", values
+    if value_type is float:
+        return "float", array("d", values)
+    if issubclass(value_type, Enum):
+        index = {member: i for i, member in enumerate(value_type)}
+        return "enum", value_type, array("q", [index[v] for v in values])
+    if value_type is tuple and all(len(v) == len(values[0]) for v in values):
+        return "tuples", [encode_column([v[i] for v in values]) for i in range(len(values[0]))]
+    if value_type is list:
+        return "lists", array("q", [len(v) for v in values]), encode_column([item for v in values for item in v])
+    if value_type is dict or (value_type is defaultdict and
+                              all(v.default_factory is values[0].default_factory for v in values)):
+        return "dicts", value_type, getattr(values[0], "default_factory", None), array("q", [len(v) for v in values]), \
+               encode_column([key for v in values for key in v.keys()]), \
+               encode_column([item for v in values for item in v.values()])
+    if value_type is array and all(v.typecode == values[0].typecode for v in values):
+        flat = array(values[0].typecode)
+        for v in values:
+            flat.extend(v)
+        return "arrays", array("q", [len(v) for v in values]), flat
+    if value_type is SortedKeyList and all(v.key is values[0].key for v in values):
+        return "sorted", values[0].key, array("q", [len(v) for v in values]), \
+               encode_column([item for v in values for item in v])
+    attributes = plain_attributes(values)
+    if attributes is not None:
+        return "records", value_type, {name: encode_column(column) for name, column in attributes.items()}
+    return "objects", values
+
+
+def split(items: List, lengths) -> List[List]:
+    ends = list(accumulate(lengths))
+    return [items[end - length:end] for end, length in zip(ends, lengths)]
+
+
+def decode_column(column, count: int) -> List:
+    kind = column[0]
+    if kind in ("int", "float", "objects"):
+        return list(column[1])
+    if kind == "money":
+        # money comes back as the implementation chosen for this run
+        return [Money(creds) for creds in column[1]]
+    if kind == "enum":
+        members = list(column[1])
+        return [members[i] for i in column[2]]
+    if kind == "tuples":
+        fields = [decode_column(field, count) for field in column[1]]
+        return list(zip(*fields)) if len(fields) > 0 else [()] * count
+    if kind == "lists":
+        lengths = column[1]
+        return split(decode_column(column[2], sum(lengths)), lengths)
+    if kind == "dicts":
+        dict_type, default_factory, lengths = column[1], column[2], column[3]
+        keys = split(decode_column(column[4], sum(lengths)), lengths)
+        items = split(decode_column(column[5], sum(lengths)), lengths)
+        if dict_type is defaultdict:
+            return [defaultdict(default_factory, zip(k, v)) for k, v in zip(keys, items)]
+        return [dict(zip(k, v)) for k, v in zip(keys, items)]
+    if kind == "sorted":
+        key, lengths = column[1], column[2]
+        return [SortedKeyList(items, key=key) for items in split(decode_column(column[3], sum(lengths)), lengths)]
+    if kind == "arrays":
+        lengths, flat = column[1], column[2]
+        ends = list(accumulate(lengths))
+        return [flat[end - length:end] for end, length in zip(ends, lengths)]
+    if kind == "records":
+        record_type, names = column[1], list(column[2].keys())
+        fields = [decode_column(field, count) for field in column[2].values()]
+        records = []
+        for values in (zip(*fields) if len(fields) > 0 else [()] * count):
+            record = record_type.__new__(record_type)
+            if hasattr(record, "__dict__"):
+                record.__dict__.update(zip(names, values))
+            else:
+                for name, value in zip(names, values):
+                    setattr(record, name, value)
+            records.append(record)
+        return records
+    raise Exception(f"Unknown column kind {kind} in checkpoint")
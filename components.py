@@ -1,10 +1,13 @@
-import statistics
+import hashlib
+import mmap
+import os
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import defaultdict, namedtuple
-from random import random
-from typing import Dict, Tuple, List, Union
+from random import random, Random, SystemRandom
+from typing import Dict, Tuple, List, Union, Optional
 
 import icontract
-from sortedcontainers import SortedList  # type: ignore
 from enum import Enum
 
 
@@ -31,6 +34,15 @@ class Resource(Enum):
         return f"{self.name}"
 
 
+# position of every resource in arrays indexed by resource, reading an attribute is much cheaper than hashing an enum
+for _resource in Resource:
+    _resource.slot = _resource.value + 1
+del _resource
+NO_LIMIT = float("inf")
+EMPTY_STORAGE = array("d", [0] * len(Resource))
+UNLIMITED_STORAGE = array("d", [NO_LIMIT] * len(Resource))
+
+
 class OrderStatus(Enum):
     UNPROCESSED = -2
     BOUGHT = -1
@@ -42,6 +54,8 @@ class OrderStatus(Enum):
 
 
 class ResourcePile:
+    __slots__ = ("resource_type", "amount")
+
     def __init__(self, resource_type: Resource, amount_needed: float = 1):
         self.resource_type = resource_type
         self.amount = amount_needed
@@ -54,6 +68,8 @@ class ResourcePile:
 
 
 class Details:
+    __slots__ = ("name",)
+
     def __init__(self, name):
         self.name = name
 
@@ -65,15 +81,19 @@ class Details:
 
 
 class Storage:
+    # amounts and limits of all resources in arrays indexed by Resource.slot, resources without a limit have NO_LIMIT
+    __slots__ = ("stored", "limits")
+
     def __init__(self):
-        self.stored_resources = defaultdict(int)
-        self.limit = dict()
+        self.stored = array("d", EMPTY_STORAGE)
+        self.limits = array("d", UNLIMITED_STORAGE)
 
     def __str__(self):
         contents = []
-        for type, amount in self.stored_resources.items():
+        for type in Resource:
+            amount = self.stored[type.slot]
             if amount > 0:
-                limit = f"/{self.limit[type]:.2f}" if type in self.limit else ""
+                limit = f"/{self.limits[type.slot]:.2f}" if self.limits[type.slot] != NO_LIMIT else ""
                 contents.append(f"{type}: {amount:.2f}{limit}")
         if len(contents) > 0:
             return f"Storage: {', '.join(contents)}"
@@ -81,63 +101,68 @@ class Storage:
             return "Storage: EMPTY"
 
     def amount(self, resource_type):
-        return self.stored_resources[resource_type]
+        return self.stored[resource_type.slot]
 
     def add(self, pile: ResourcePile):
         if self.will_fit(pile):
-            self.stored_resources[pile.resource_type] += pile.amount
+            self.stored[pile.resource_type.slot] += pile.amount
         else:
             raise Exception(f"Attempted to overfill storage with {pile}")
 
+    def add_up_to_limit(self, pile: ResourcePile):
+        # for amounts which fit but for a rounding error
+        slot = pile.resource_type.slot
+        self.stored[slot] = min(self.stored[slot] + pile.amount, self.limits[slot])
+
     def add_one_of(self, resource: Resource):
         if self.will_fit_one_of(resource):
-            self.stored_resources[resource] += 1
+            self.stored[resource.slot] += 1
         else:
             raise Exception(f"Attempted to overfill storage with {resource}")
 
     def add_all(self, storage: 'Storage'):
-        for resource in storage.stored_resources:
-            self.add(ResourcePile(resource, storage.stored_resources[resource]))
+        for resource in Resource:
+            if storage.stored[resource.slot] != 0:
+                self.add(ResourcePile(resource, storage.stored[resource.slot]))
 
     def set_limit(self, pile: ResourcePile):
-        self.limit[pile.resource_type] = pile.amount
+        self.limits[pile.resource_type.slot] = pile.amount
 
     def will_fit(self, pile: ResourcePile):
-        type = pile.resource_type
-        return type not in self.limit or self.amount(type) + pile.amount <= self.limit[type]
+        slot = pile.resource_type.slot
+        return self.stored[slot] + pile.amount <= self.limits[slot]
 
     def will_fit_one_of(self, resource: Resource):
-        return resource not in self.limit or self.amount(resource) + 1 <= self.limit[resource]
+        return self.stored[resource.slot] + 1 <= self.limits[resource.slot]
 
     def remove(self, pile: ResourcePile):
         if self.has_at_least(pile):
-            self.stored_resources[pile.resource_type] -= pile.amount
+            self.stored[pile.resource_type.slot] -= pile.amount
         else:
             raise Exception(f"Attempted to remove more resources then there were available for {pile})")
 
     def remove_one_of(self, pile: ResourcePile):
         if self.has_one_of(pile):
-            self.stored_resources[pile.resource_type] -= 1
+            self.stored[pile.resource_type.slot] -= 1
         else:
             raise Exception(f"Attempted to remove more resources then there were available for {pile})")
 
     def has_at_least(self, pile: ResourcePile):
-        return self.amount(pile.resource_type) >= pile.amount
+        return self.stored[pile.resource_type.slot] >= pile.amount
 
     def has_one_of(self, pile: ResourcePile):
-        return self.amount(pile.resource_type) >= 1
+        return self.stored[pile.resource_type.slot] >= 1
 
     def has_one(self, resource: Resource):
-        return self.amount(resource) >= 1
+        return self.stored[resource.slot] >= 1
 
 
-@icontract.invariant(lambda self: self.creds >= 0, "Money cannot become negative")
-class Money:
+class FastMoney:
+    # Money without any checks, used for long runs. Operations create money of the same class as self so checked money
+    # stays checked.
+    __slots__ = ("creds",)
 
     def __init__(self, creds: int):
-        if not isinstance(creds, int):
-            raise TypeError(f"Expected {int} but got {type(creds)}")
-
         self.creds = creds
 
     def __str__(self):
@@ -162,36 +187,63 @@ class Money:
         return self.creds
 
     def __add__(self, other: 'Money') -> 'Money':
-        return Money(self.creds + other.creds)
+        return self.__class__(self.creds + other.creds)
 
     def __sub__(self, other: 'Money') -> 'Money':
-        return Money(self.creds - other.creds)
+        return self.__class__(self.creds - other.creds)
 
     def multiply(self, multiplier: float) -> 'Money':
-        return Money(int(self.creds * multiplier))
+        return self.__class__(int(self.creds * multiplier))
 
-    def split(self) -> Tuple['Money', 'Money']:
-        result = (Money(self.creds // 2 + self.creds % 2), Money(self.creds // 2))
-        assert result[0].creds + result[1].creds == self.creds
+    def split(self, rng: Optional[Random] = None) -> Tuple['Money', 'Money']:
+        result = (self.__class__(self.creds // 2 + self.creds % 2), self.__class__(self.creds // 2))
         # give last penny out randomly
-        if random() < 0.5:
+        if (rng.random() if rng is not None else random()) < 0.5:
             return result
         else:
             return result[1], result[0]
 
     def remove(self, money: 'Money') -> 'Money':
-        if not isinstance(money, Money):
+        if not isinstance(money, FastMoney):
             raise TypeError(f"Expected {Money} but got {type(money)}")
         else:
-            return Money(self.creds - money.creds)
+            return self.__class__(self.creds - money.creds)
+
+
+@icontract.invariant(lambda self: self.creds >= 0, "Money cannot become negative")
+class CheckedMoney(FastMoney):
+    __slots__ = ()
+
+    def __init__(self, creds: int):
+        if not isinstance(creds, int):
+            raise TypeError(f"Expected {int} but got {type(creds)}")
+
+        super().__init__(creds)
+
+    def split(self, rng: Optional[Random] = None) -> Tuple['Money', 'Money']:
+        result = super().split(rng)
+        assert result[0].creds + result[1].creds == self.creds
+        return result
+
+
+# Checked money is used unless python runs with -O (which also turns off icontract checks) or SPACEBUSINESS_MONEY says
+# otherwise
+MONEY_IMPLEMENTATIONS = {"checked": CheckedMoney, "fast": FastMoney}
+MONEY_IMPLEMENTATION = os.environ.get("SPACEBUSINESS_MONEY", "checked" if __debug__ else "fast")
+if MONEY_IMPLEMENTATION not in MONEY_IMPLEMENTATIONS:
+    raise ValueError(f"Unknown money implementation {MONEY_IMPLEMENTATION}, use one of {list(MONEY_IMPLEMENTATIONS)}")
+Money = MONEY_IMPLEMENTATIONS[MONEY_IMPLEMENTATION]
 
 
 class Wallet:
+    __slots__ = ("money", "last_transaction", "owner")
 
-    def __init__(self, money: Money):
+    def __init__(self, money: Money, owner: Optional[int] = None):
+        # owner: entity of the wallet, wallets without it are not in the wealth index
         if not isinstance(money, Money):
             raise TypeError(f"Expected {Money} but got {type(money)}")
         self.money = money
+        self.owner = owner
         self.last_transaction: Dict[Resource, Tuple[Money, OrderStatus]] = dict()
 
     @icontract.require(lambda status: status != OrderStatus.UNPROCESSED)
@@ -209,6 +261,8 @@ class Wallet:
 
 
 class Consumer:
+    __slots__ = ("needs",)
+
     def __init__(self, pile: ResourcePile = None):
         self.needs = []
         if pile is not None:
@@ -219,15 +273,17 @@ class Consumer:
 
 # marker interfaces
 class Hunger:
-    pass
+    __slots__ = ()
 
 class Terminated:
-    pass
+    __slots__ = ()
 
 class InheritancePool:
-    pass
+    __slots__ = ()
 
 class Producer:
+    __slots__ = ("needs", "gives")
+
     def __init__(self, needs: ResourcePile, gives: ResourcePile):
         self.needs = needs
         self.gives = gives
@@ -240,6 +296,8 @@ class Producer:
 
 
 class Need:
+    __slots__ = ("name", "priority", "pile", "price_change_on_buy", "price_change_on_failed_buy")
+
     def __init__(self, name, priority, pile: ResourcePile, price_change_on_buy, price_change_on_failed_buy):
         self.name = name
         self.priority = priority
@@ -254,50 +312,151 @@ class Need:
         return self.pile.resource_type
 
 
+def need_priority(need: Need):
+    return need.priority
+
+
+class NeedProfile:
+    # Needs shared by all agents of one kind, sorted by priority once. They are shared, so they must not be changed.
+    __slots__ = ("name", "needs")
+
+    def __init__(self, name: str, needs: List[Need]):
+        self.name = name
+        # needs with the same priority keep their order
+        self.needs: Tuple[Need, ...] = tuple(sorted(needs, key=need_priority))
+
+    def __reduce__(self):
+        # checkpoints pickle a profile once, not once for every agent having it
+        return NeedProfile, (self.name, list(self.needs))
+
+    def with_need(self, need: Need) -> 'NeedProfile':
+        return NeedProfile(self.name, list(self.needs) + [need])
+
+
 class Needs:
-    def __init__(self):
-        self.needs = SortedList(key=lambda x: x.priority)
+    # Needs of an agent: a shared profile and needs of this agent only, which replace needs of the profile with the
+    # same name (and keep their place)
+    __slots__ = ("profile", "overrides")
+
+    def __init__(self, profile: Optional[NeedProfile] = None):
+        self.profile = profile if profile is not None else NeedProfile("own", [])
+        self.overrides: Optional[Dict[str, Need]] = None
 
     def add(self, need: Need):
-        self.needs.add(need)
+        # the profile may be shared, this agent gets a new one
+        self.profile = self.profile.with_need(need)
+
+    def override(self, need: Need):
+        if self.overrides is None:
+            self.overrides = {}
+        self.overrides[need.name] = need
 
     def __iter__(self):
-        return self.needs.__iter__()
+        if self.overrides is None:
+            return iter(self.profile.needs)
+        return (self.overrides.get(need.name, need) for need in self.profile.needs)
 
 
 class SellOrder:
-    def __init__(self, owner, resource: Resource, price: Money, status: OrderStatus = OrderStatus.UNPROCESSED):
+    __slots__ = ("owner", "resource", "price", "amount", "filled", "status")
+
+    def __init__(self, owner, resource: Resource, price: Money, amount: int = 1,
+                 status: OrderStatus = OrderStatus.UNPROCESSED):
         if not isinstance(price, Money):
             raise TypeError(f"Expected {Money} but got {type(price)}")
         self.owner = owner
         self.resource = resource
         self.price = price
+        self.amount = amount
+        self.filled = 0
         self.status = status
 
+    def remaining(self) -> int:
+        return self.amount - self.filled
+
+    def fill(self, amount: int):
+        self.filled += amount
+        if self.remaining() == 0:
+            self.status = OrderStatus.SOLD
+
     def __str__(self):
-        return f"SellOrder: {self.resource} for at least {self.price}"
+        return f"SellOrder: {self.amount} {self.resource} for at least {self.price} each"
 
     def __repr__(self):
-        return f"Sell: {self.resource} for {self.price}"
+        return f"Sell: {self.amount} {self.resource} for {self.price}"
 
 
 class BuyOrder:
-    def __init__(self, owner, resource: Resource, price: Money, status: OrderStatus = OrderStatus.UNPROCESSED):
+    __slots__ = ("owner", "resource", "price", "amount", "filled", "status")
+
+    def __init__(self, owner, resource: Resource, price: Money, amount: int = 1,
+                 status: OrderStatus = OrderStatus.UNPROCESSED):
         if not isinstance(price, Money):
             raise TypeError(f"Expected {Money} but got {type(price)}")
         self.owner = owner
         self.resource = resource
         self.price = price
+        self.amount = amount
+        self.filled = 0
         self.status = status
 
+    def remaining(self) -> int:
+        return self.amount - self.filled
+
+    def fill(self, amount: int):
+        self.filled += amount
+        if self.remaining() == 0:
+            self.status = OrderStatus.BOUGHT
+
     def __str__(self):
-        return f"BuyOrder: {self.resource} for {self.price} at maximum"
+        return f"BuyOrder: {self.amount} {self.resource} for {self.price} each at maximum"
 
     def __repr__(self):
-        return f"Buy: {self.resource} for {self.price}"
+        return f"Buy: {self.amount} {self.resource} for {self.price}"
+
 
+Stat = namedtuple('Stat', ['resource', 'order_type', 'length', 'min', 'median', 'max', 'p10', 'p90'],
+                  defaults=[None, None])
 
-Stat = namedtuple('Stat', ['resource', 'order_type', 'length', 'min', 'median', 'max'])
+
+class PriceAccumulator:
+    # Units at every price, fed one order or trade at a time. Length, min and max are kept as prices come, quantiles
+    # are exact and sort only the distinct prices of a day, of which there are far less than units.
+    def __init__(self):
+        self.units: Dict[int, int] = defaultdict(int)
+        self.length = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def add(self, price: Money, amount: int = 1):
+        creds = price.creds
+        self.units[creds] += amount
+        self.length += amount
+        if self.min is None or creds < self.min:
+            self.min = creds
+        if self.max is None or creds > self.max:
+            self.max = creds
+
+    def quantiles(self, *qs: float) -> List[Optional[Money]]:
+        # lowest price at which at least q of all units are included, 0.5 gives statistics.median_low
+        if self.length == 0:
+            return [None] * len(qs)
+        ranks = sorted((int((self.length - 1) * q), i) for i, q in enumerate(qs))
+        result: List[Optional[Money]] = [None] * len(qs)
+        below, r = 0, 0
+        for creds in sorted(self.units):
+            below += self.units[creds]
+            while r < len(ranks) and ranks[r][0] < below:
+                result[ranks[r][1]] = Money(creds)
+                r += 1
+        return result
+
+    def stat(self, resource: 'Resource', order_type: 'OrderType') -> Stat:
+        if self.length == 0:
+            return Stat(resource=resource, order_type=order_type, length=0, min=None, median=None, max=None)
+        p10, median, p90 = self.quantiles(0.1, 0.5, 0.9)
+        return Stat(resource=resource, order_type=order_type, length=self.length, min=Money(self.min), median=median,
+                    max=Money(self.max), p10=p10, p90=p90)
 
 
 class StarDate:
@@ -317,35 +476,164 @@ class StarDate:
         return f"SD {self.START_YEAR + self.time // self.TURNS_IN_YEAR}.{self.time % self.TURNS_IN_YEAR}"
 
 
+class RandomStream(Random):
+    # Every world draws all its random numbers from its own stream so that runs with the same seed are the same
+    def __init__(self, seed: Optional[int] = None):
+        self.initial_seed = seed if seed is not None else SystemRandom().getrandbits(64)
+        super().__init__(self.initial_seed)
+
+    def __reduce__(self):
+        # keeps the seed so that substreams of a restored stream are the same
+        return self.__class__, (self.initial_seed,), self.getstate()
+
+    def substream(self, key) -> 'RandomStream':
+        # independent stream which depends only on the seed of this one and the key, not on numbers drawn so far
+        digest = hashlib.sha256(f"{self.initial_seed}/{key}".encode()).digest()
+        return RandomStream(int.from_bytes(digest[:8], "big"))
+
+
+# Every row of StatsHistory holds stats of one resource in one day: time, resource and length, min, median and max of
+# every stat of StatsForDay plus its 10th and 90th percentile. Prices are kept as creds, days without a price have NO_PRICE.
+DAY_STATS = {"fulfilled_sell": OrderType.SELL, "fulfilled_buy": OrderType.BUY, "transactions": OrderType.TRANSACTION,
+             "sell_stats": OrderType.SELL, "buy_stats": OrderType.BUY}
+STAT_FIELDS = ["length", "min", "p10", "median", "p90", "max"]
+ROW = ["time", "resource"] + [f"{stat}.{field}" for stat in DAY_STATS for field in STAT_FIELDS]
+NO_PRICE = -1
+ROW_BYTES = len(ROW) * array("q").itemsize
+
+
 class StatsHistory:
-    def __init__(self):
-        self.history = {}
+    # Stats of the last window days are kept in memory in typed columns. Older days are written to spill_path, or
+    # forgotten without it. Range queries read both. Only the first first_row rows of the spill file belong to this
+    # history, rows after them (left by an earlier run or written after a checkpoint was saved) are overwritten.
+    @icontract.require(lambda window: window is None or window >= 2, "Ordering needs stats of yesterday")
+    def __init__(self, window: Optional[int] = StarDate.TURNS_IN_YEAR, spill_path: Optional[str] = None):
+        self.window = window
+        self.spill_path = spill_path
+        self.columns = {field: array("q") for field in ROW}
+        # absolute row number of every day in memory, first_row is the number of rows evicted so far
+        self.rows: Dict[Tuple[int, Resource], int] = {}
+        self.first_row = 0
 
     def register_day_transactions(self, date: StarDate, resource: Resource, all_buy, all_sell, fulfilled_buy,
-                                  fulfilled_sell, transactions: List[Money]):
-        self.history[(date.time, resource)] = StatsForDay(date, resource, all_buy, all_sell, fulfilled_buy,
-                                                          fulfilled_sell, transactions)
-
-    def stats_for_day(self, date: StarDate, resource: Resource):
-        return self.history[(date.time, resource)]
+                                  fulfilled_sell, transactions: List[Tuple[Money, int]]):
+        self.register_day(StatsForDay.for_prices(date, resource, all_buy, all_sell, fulfilled_buy, fulfilled_sell,
+                                                 transactions))
+
+    def register_day(self, stats: 'StatsForDay'):
+        date, resource, row = stats.date, stats.resource, stats_to_row(stats)
+        if (date.time, resource) in self.rows:
+            position = self.rows[(date.time, resource)] - self.first_row
+            for field, value in zip(ROW, row):
+                self.columns[field][position] = value
+        else:
+            self.rows[(date.time, resource)] = self.first_row + len(self.columns["time"])
+            for field, value in zip(ROW, row):
+                self.columns[field].append(value)
+        if self.window is not None:
+            self.evict_before(date.time - self.window + 1)
+
+    def evict_before(self, time: int):
+        evicted = bisect_left(self.columns["time"], time)
+        if evicted == 0:
+            return
+        if self.spill_path is not None:
+            with open(self.spill_path, "r+b" if os.path.exists(self.spill_path) else "wb") as spill:
+                spill.seek(self.first_row * ROW_BYTES)
+                array("q", [self.columns[field][i] for i in range(evicted) for field in ROW]).tofile(spill)
+                spill.truncate()
+        for i in range(evicted):
+            del self.rows[(self.columns["time"][i], Resource(self.columns["resource"][i]))]
+        for column in self.columns.values():
+            del column[:evicted]
+        self.first_row += evicted
+
+    def stats_for_day(self, date: StarDate, resource: Resource) -> 'StatsForDay':
+        if (date.time, resource) in self.rows:
+            position = self.rows[(date.time, resource)] - self.first_row
+            return stats_from_row([self.columns[field][position] for field in ROW])
+        for stats in self.spilled_between(date.time, date.time):
+            if stats.resource == resource:
+                return stats
+        raise KeyError(f"No stats of {resource} for {date}")
 
     def has_stats_for_day(self, date: StarDate, resource: Resource):
-        return (date.time, resource) in self.history
+        # only days in memory are checked
+        return (date.time, resource) in self.rows
+
+    def stats_between(self, start: int, end: int, resource: Optional[Resource] = None) -> List['StatsForDay']:
+        # stats of all days from start to end (both included), oldest first
+        days = self.spilled_between(start, end)
+        times = self.columns["time"]
+        for position in range(bisect_left(times, start), bisect_right(times, end)):
+            days.append(stats_from_row([self.columns[field][position] for field in ROW]))
+        return [stats for stats in days if resource is None or stats.resource == resource]
+
+    def spilled_between(self, start: int, end: int) -> List['StatsForDay']:
+        if self.spill_path is None or self.first_row == 0 or not os.path.exists(self.spill_path):
+            return []
+        with open(self.spill_path, "rb") as spill:
+            # a file cut short (or replaced) has fewer rows, which are all there is to read
+            spilled = min(self.first_row, os.fstat(spill.fileno()).st_size // ROW_BYTES)
+            if spilled == 0:
+                return []
+            with mmap.mmap(spill.fileno(), spilled * ROW_BYTES, access=mmap.ACCESS_READ) as data:
+                values = memoryview(data).cast("q")
+                times = values[0::len(ROW)]
+                rows = [values[i * len(ROW):(i + 1) * len(ROW)].tolist()
+                        for i in range(bisect_left(times, start), bisect_right(times, end))]
+                times.release()
+                values.release()
+        return [stats_from_row(row) for row in rows]
+
+
+def stats_to_row(stats: 'StatsForDay') -> List[int]:
+    row = [stats.date.time, stats.resource.value]
+    for stat in DAY_STATS:
+        row.extend(stat_to_row(getattr(stats, stat)))
+    return row
+
+
+def stat_to_row(stat: Stat) -> List[int]:
+    prices = [getattr(stat, field) for field in STAT_FIELDS[1:]]
+    return [stat.length] + [NO_PRICE if price is None else price.creds for price in prices]
+
+
+def stats_from_row(row: List[int]) -> 'StatsForDay':
+    resource = Resource(row[1])
+    stats = {}
+    for i, (stat, order_type) in enumerate(DAY_STATS.items()):
+        length, *prices = row[2 + i * len(STAT_FIELDS):2 + (i + 1) * len(STAT_FIELDS)]
+        fields = {field: None if price == NO_PRICE else Money(price) for field, price in zip(STAT_FIELDS[1:], prices)}
+        stats[stat] = Stat(resource=resource, order_type=order_type, length=length, **fields)
+    return StatsForDay(StarDate(row[0]), resource, **stats)
 
 
 class StatsForDay:
-    def __init__(self, date: StarDate, resource: Resource, all_buy, all_sell, fulfilled_buy, fulfilled_sell,
-                 transactions: List[Money]):
-        self.fulfilled_sell = self.calculate_base_stats(resource, OrderType.SELL, fulfilled_sell)
-        self.fulfilled_buy = self.calculate_base_stats(resource, OrderType.BUY, fulfilled_buy)
-        self.transactions = self.calculate_stats_for_prices(resource, OrderType.TRANSACTION, transactions)
+    def __init__(self, date: StarDate, resource: Resource, fulfilled_sell: Stat, fulfilled_buy: Stat,
+                 transactions: Stat, sell_stats: Stat, buy_stats: Stat):
+        self.fulfilled_sell = fulfilled_sell
+        self.fulfilled_buy = fulfilled_buy
+        self.transactions = transactions
         self.date = date
 
-        self.sell_stats = self.calculate_base_stats(resource, OrderType.SELL, all_sell)
-        self.buy_stats = self.calculate_base_stats(resource, OrderType.BUY, all_buy)
+        self.sell_stats = sell_stats
+        self.buy_stats = buy_stats
         self.resource = resource
         self.total = self.buy_stats.length + self.sell_stats.length
 
+    @staticmethod
+    def for_prices(date: StarDate, resource: Resource, all_buy, all_sell, fulfilled_buy, fulfilled_sell,
+                   transactions: List[Tuple[Money, int]]) -> 'StatsForDay':
+        # all order lists and transactions are given as (price, amount) pairs
+        market = MarketStats(date, resource)
+        for name, prices in [("fulfilled_sell", fulfilled_sell), ("fulfilled_buy", fulfilled_buy),
+                             ("transactions", transactions), ("sell_stats", all_sell), ("buy_stats", all_buy)]:
+            accumulator = market.accumulators[name]
+            for price, amount in prices:
+                accumulator.add(price, amount)
+        return market.stats_for_day()
+
     def __str__(self):
         buy, sell, transactions = "", "", ""
         if self.transactions.length > 0:
@@ -363,14 +651,17 @@ class StatsForDay:
             transactions = ",,"
         return f"{self.date},{self.resource},{self.buy_stats.length},{self.sell_stats.length},{self.transactions.length},{transactions}"
 
-    def calculate_stats_for_prices(self, resource: Resource, order_type: OrderType, prices: List[Money]) -> Stat:
-        if len(prices) > 0:
-            median = Money(statistics.median_low([p.creds for p in prices]))
-            return Stat(resource=resource, order_type=order_type, length=len(prices), min=min(prices), median=median,
-                        max=max(prices))
-        else:
-            return Stat(resource=resource, order_type=order_type, length=len(prices), min=None, median=None, max=None)
 
-    def calculate_base_stats(self, resource: Resource, order_type: OrderType, orders):
-        prices = [o.price for ent, o in orders]
-        return self.calculate_stats_for_prices(resource, order_type, prices)
+class MarketStats:
+    # Accumulators of one market in one day, the exchange feeds them while it matches orders
+    def __init__(self, date: StarDate, resource: Resource):
+        self.date = date
+        self.resource = resource
+        self.accumulators = {name: PriceAccumulator() for name in DAY_STATS}
+
+    def add(self, name: str, price: Money, amount: int = 1):
+        self.accumulators[name].add(price, amount)
+
+    def stats_for_day(self) -> StatsForDay:
+        return StatsForDay(self.date, self.resource, **{name: accumulator.stat(self.resource, DAY_STATS[name])
+                                                         for name, accumulator in self.accumulators.items()})
@@ -1,5 +1,27 @@
+from functools import lru_cache
+
 from components import Consumer, ResourcePile, Resource, Details, Storage, Producer, SellOrder, Wallet, Needs, Need, \
-    Money
+    Money, NeedProfile
+from ledger import ledger_for
+
+
+def open_wallet(world, money, owner=None) -> Wallet:
+    wallet = Wallet(Money(money), owner)
+    ledger_for(world).open(wallet)
+    return wallet
+
+
+# profiles are made once for every combination of parameters and shared by all agents created with it
+@lru_cache(maxsize=None)
+def person_needs(food_consumption, water_consumption) -> NeedProfile:
+    return NeedProfile("person", [
+        Need("have water for tomorrow", priority=0, pile=ResourcePile(Resource.WATER, water_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1),
+        Need("have food for tomorrow", priority=1, pile=ResourcePile(Resource.FOOD, food_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1),
+        Need("have water for next few days", priority=2, pile=ResourcePile(Resource.WATER, 5*water_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1),
+        Need("have food for next few days", priority=2, pile=ResourcePile(Resource.FOOD, 4*food_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1),
+        Need("have a big stash of water", priority=3, pile=ResourcePile(Resource.WATER, 15*water_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1),
+        Need("have a big stash of food", priority=3, pile=ResourcePile(Resource.FOOD, 10*food_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1),
+    ])
 
 
 def create_person(world, name, food_consumption, food_amount, water_consumption, water_amount, money):
@@ -10,16 +32,10 @@ def create_person(world, name, food_consumption, food_amount, water_consumption,
     # not possible to store man days
     storage.set_limit(ResourcePile(Resource.MAN_DAY, 1))
 
-    needs = Needs()
-    needs.add(Need("have water for tomorrow", priority=0, pile=ResourcePile(Resource.WATER, water_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1))
-    needs.add(Need("have food for tomorrow", priority=1, pile=ResourcePile(Resource.FOOD, food_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1))
-    needs.add(Need("have water for next few days", priority=2, pile=ResourcePile(Resource.WATER, 5*water_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1))
-    needs.add(Need("have food for next few days", priority=2, pile=ResourcePile(Resource.FOOD, 4*food_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1))
-    needs.add(Need("have a big stash of water", priority=3, pile=ResourcePile(Resource.WATER, 15*water_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1))
-    needs.add(Need("have a big stash of food", priority=3, pile=ResourcePile(Resource.FOOD, 10*food_consumption), price_change_on_buy=0.8, price_change_on_failed_buy=1.1))
+    needs = Needs(person_needs(food_consumption, water_consumption))
 
     world.add_component(person, Details(name))
-    world.add_component(person, Wallet(Money(money)))
+    world.add_component(person, open_wallet(world, money, person))
     consumption = Consumer()
     consumption.add_need(ResourcePile(Resource.FOOD, food_consumption))
     consumption.add_need(ResourcePile(Resource.WATER, water_consumption))
@@ -32,16 +48,24 @@ def create_person(world, name, food_consumption, food_amount, water_consumption,
     world.add_component(person, needs)
     return person
 
+@lru_cache(maxsize=None)
+def workplace_needs() -> NeedProfile:
+    return NeedProfile("workplace", [
+        Need("have someone in work", priority=1, pile=ResourcePile(Resource.MAN_DAY), price_change_on_buy=0.9, price_change_on_failed_buy=1.1),
+        #Need("have someone in work", priority=2, pile=ResourcePile(Resource.MAN_DAY), price_change_on_buy=0.8, price_change_on_failed_buy=1.05),
+        #Need("have someone in work", priority=3, pile=ResourcePile(Resource.MAN_DAY), price_change_on_buy=0.7, price_change_on_failed_buy=1.02),
+    ])
+
+
 def create_well(world, name, labour_consumption, water_production, water_storage, money):
     entity = world.create_entity()
     storage = Storage()
     storage.set_limit(ResourcePile(Resource.WATER, water_storage))
 
-    needs = Needs()
-    needs.add(Need("have someone in work", priority=1, pile=ResourcePile(Resource.MAN_DAY), price_change_on_buy=0.9, price_change_on_failed_buy=1.1))
+    needs = Needs(workplace_needs())
 
     world.add_component(entity, Details(name))
-    world.add_component(entity, Wallet(Money(money)))
+    world.add_component(entity, open_wallet(world, money, entity))
     world.add_component(entity, Producer(ResourcePile(Resource.MAN_DAY, labour_consumption), ResourcePile(Resource.WATER, water_production)))
     world.add_component(entity, storage)
     world.add_component(entity, needs)
@@ -53,32 +77,35 @@ def create_farm(world, name, labour_consumption, food_production, food_storage,
     storage = Storage()
     storage.set_limit(ResourcePile(Resource.FOOD, food_storage))
 
-    needs = Needs()
-    needs.add(Need("have someone in work", priority=1, pile=ResourcePile(Resource.MAN_DAY), price_change_on_buy=0.9, price_change_on_failed_buy=1.1))
-    #needs.add(Need("have someone in work", priority=2, pile=ResourcePile(Resource.MAN_DAY), price_change_on_buy=0.8, price_change_on_failed_buy=1.05))
-    #needs.add(Need("have someone in work", priority=3, pile=ResourcePile(Resource.MAN_DAY), price_change_on_buy=0.7, price_change_on_failed_buy=1.02))
+    needs = Needs(workplace_needs())
 
     world.add_component(farm, Details(name))
-    world.add_component(farm, Wallet(Money(money)))
+    world.add_component(farm, open_wallet(world, money, farm))
     world.add_component(farm, Producer(ResourcePile(Resource.MAN_DAY, labour_consumption), ResourcePile(Resource.FOOD, food_production)))
     world.add_component(farm, storage)
     world.add_component(farm, needs)
     return farm
 
+@lru_cache(maxsize=None)
+def cloning_center_needs(embryo_food_cost) -> NeedProfile:
+    return NeedProfile("cloning center", [
+        Need("food for one embryo", priority=1, pile=ResourcePile(Resource.FOOD, embryo_food_cost), price_change_on_buy=0.95, price_change_on_failed_buy=1.1),
+        Need("food for some more embrios", priority=2, pile=ResourcePile(Resource.FOOD, embryo_food_cost * 2), price_change_on_buy=0.9, price_change_on_failed_buy=1.05),
+        Need("food for even more embrios", priority=3, pile=ResourcePile(Resource.FOOD, embryo_food_cost * 3), price_change_on_buy=0.9, price_change_on_failed_buy=1.05),
+        #Need("have someone in work", priority=3, pile=ResourcePile(Resource.MAN_DAY), price_change_on_buy=0.7, price_change_on_failed_buy=1.02),
+    ])
+
+
 def create_cloning_center(world, name, embryo_storage, embryo_food_cost, money):
     cloning_center = world.create_entity()
 
     storage = Storage()
     storage.set_limit(ResourcePile(Resource.EMBRYO, embryo_storage))
 
-    needs = Needs()
-    needs.add(Need("food for one embryo", priority=1, pile=ResourcePile(Resource.FOOD, embryo_food_cost), price_change_on_buy=0.95, price_change_on_failed_buy=1.1))
-    needs.add(Need("food for some more embrios", priority=2, pile=ResourcePile(Resource.FOOD, embryo_food_cost * 2), price_change_on_buy=0.9, price_change_on_failed_buy=1.05))
-    needs.add(Need("food for even more embrios", priority=3, pile=ResourcePile(Resource.FOOD, embryo_food_cost * 3), price_change_on_buy=0.9, price_change_on_failed_buy=1.05))
-    #needs.add(Need("have someone in work", priority=3, pile=ResourcePile(Resource.MAN_DAY), price_change_on_buy=0.7, price_change_on_failed_buy=1.02))
+    needs = Needs(cloning_center_needs(embryo_food_cost))
 
     world.add_component(cloning_center, Details(name))
-    world.add_component(cloning_center, Wallet(Money(money)))
+    world.add_component(cloning_center, open_wallet(world, money, cloning_center))
     # FIXME this should create embryo first but producing system allows only for one person to produce one thing (no more labor if man needs to change embrio to grown_human)
     # world.add_component(cloning_center, Producer(ResourcePile(Resource.FOOD, embryo_food_cost), ResourcePile(Resource.EMBRYO)))
     world.add_component(cloning_center, Producer(ResourcePile(Resource.FOOD, embryo_food_cost), ResourcePile(Resource.GROWN_HUMAN)))
@@ -1,4 +1,29 @@
-from components import StatsHistory, StarDate
+from components import StatsHistory, StarDate, RandomStream
+from order_pool import OrderPool
 
-stats_history = StatsHistory()
-star_date = StarDate()
+
+# Date, price history, random numbers and the order pool live on the globals entity of every world so that many worlds can run in one process.
+# Worlds created without them (like in tests) get new ones when they are needed for the first time.
+def star_date_for(world) -> StarDate:
+    return global_component(world, StarDate)
+
+
+def stats_history_for(world) -> StatsHistory:
+    return global_component(world, StatsHistory)
+
+
+def random_for(world) -> RandomStream:
+    return global_component(world, RandomStream)
+
+
+def order_pool_for(world) -> OrderPool:
+    return global_component(world, OrderPool)
+
+
+def global_component(world, component_type):
+    components = world.get_component(component_type)
+    if len(components) > 0:
+        return components[0][1]
+    component = component_type()
+    world.create_entity(component)
+    return component
@@ -0,0 +1,90 @@
+import csv
+import time
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+
+import esper  # type: ignore
+
+from cached_world import CachedWorld
+
+
+class ProcessorSample:
+    # what one processor did in one tick
+    def __init__(self):
+        self.wall_time = 0.0
+        self.calls = 0
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    def __repr__(self):
+        return f"{self.wall_time * 1000:.2f}ms in {self.calls} calls {dict(self.counters)}"
+
+
+class TickSample:
+    def __init__(self, tick: int):
+        self.tick = tick
+        self.processors: Dict[str, ProcessorSample] = defaultdict(ProcessorSample)
+
+
+class Instrumentation:
+    # Keeps samples of the last capacity ticks and wall time totals of the whole run
+    def __init__(self, capacity: int = 1000):
+        self.samples: deque = deque(maxlen=capacity)
+        self.ticks = 0
+        self.wall_time_totals: Dict[str, float] = defaultdict(float)
+        self.counter_totals: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def start_tick(self):
+        self.ticks += 1
+        self.samples.append(TickSample(self.ticks))
+
+    def current(self) -> Optional[TickSample]:
+        return self.samples[-1] if len(self.samples) > 0 else None
+
+    def record(self, processor: str, wall_time: float):
+        sample = self.samples[-1].processors[processor]
+        sample.wall_time += wall_time
+        sample.calls += 1
+        self.wall_time_totals[processor] += wall_time
+
+    def count(self, processor: str, counter: str, items: int):
+        if len(self.samples) > 0:
+            self.samples[-1].processors[processor].counters[counter] += items
+            self.counter_totals[processor][counter] += items
+
+    def last(self, ticks: int = 1) -> List[TickSample]:
+        return list(self.samples)[-ticks:]
+
+    def to_csv(self, path: str):
+        # one row per measured value, so that processors with different counters fit in the same file
+        with open(path, mode="w", newline="") as output:
+            writer = csv.writer(output)
+            writer.writerow(["tick", "processor", "metric", "value"])
+            for sample in self.samples:
+                for processor, measured in sample.processors.items():
+                    writer.writerow([sample.tick, processor, "wall_time", f"{measured.wall_time:.6f}"])
+                    writer.writerow([sample.tick, processor, "calls", measured.calls])
+                    for counter, items in measured.counters.items():
+                        writer.writerow([sample.tick, processor, counter, items])
+
+
+class InstrumentedWorld(CachedWorld):
+    def __init__(self, capacity: int = 1000):
+        super().__init__()
+        self.instrumentation = Instrumentation(capacity)
+
+    def process(self, *args, **kwargs):
+        self.instrumentation.start_tick()
+        super().process(*args, **kwargs)
+
+    def _process(self, *args, **kwargs):
+        for processor in self._processors:
+            start = time.perf_counter()
+            processor.process(*args, **kwargs)
+            self.instrumentation.record(processor.__class__.__name__, time.perf_counter() - start)
+
+
+def count(processor: esper.Processor, counter: str, items: int = 1):
+    # counts items handled by a processor in current tick, does nothing in worlds which are not instrumented
+    instrumentation = getattr(processor.world, "instrumentation", None)
+    if instrumentation is not None:
+        instrumentation.count(processor.__class__.__name__, counter, items)
@@ -0,0 +1,176 @@
+from typing import Dict, List, Tuple
+
+import icontract
+from sortedcontainers import SortedList  # type: ignore
+
+from components import Money, Wallet, BuyOrder, OrderStatus
+
+
+class WealthIndex:
+    # Money of every wallet with an owner, ordered by creds. The ledger only notes wallets whose money changed, they are
+    # put in order when the index is read, so a wallet touched many times in a tick is moved once. When most wallets
+    # changed (taxes touch all of them) the old order is sorted again with the new values instead.
+    def __init__(self):
+        self.creds: Dict[int, int] = {}
+        self.order = SortedList()
+        self.total = 0
+        self.changed: Dict[int, int] = {}
+
+    def __len__(self):
+        self.refresh()
+        return len(self.order)
+
+    def add(self, owner: int, creds: int):
+        self.changed[owner] = creds
+
+    def remove(self, owner: int):
+        self.changed.pop(owner, None)
+        if owner in self.creds:
+            creds = self.creds.pop(owner)
+            self.order.remove((creds, owner))
+            self.total -= creds
+
+    def refresh(self):
+        if len(self.changed) == 0:
+            return
+        if len(self.changed) > len(self.creds) // 4:
+            new_owners = [owner for owner in self.changed if owner not in self.creds]
+            for owner, creds in self.changed.items():
+                self.total += creds - self.creds.get(owner, 0)
+                self.creds[owner] = creds
+            # taxes and UBI keep the old order nearly sorted, which timsort puts in order in about one pass
+            values = [(self.creds[owner], owner) for _, owner in self.order]
+            values.extend((self.creds[owner], owner) for owner in new_owners)
+            values.sort()
+            self.order = SortedList(values)
+        else:
+            for owner, creds in self.changed.items():
+                if owner in self.creds:
+                    self.order.remove((self.creds[owner], owner))
+                self.total += creds - self.creds.get(owner, 0)
+                self.creds[owner] = creds
+                self.order.add((creds, owner))
+        self.changed = {}
+
+    def richest(self, k: int) -> List[Tuple[int, int]]:
+        # (owner, creds) of k richest, richest first
+        self.refresh()
+        return [(owner, creds) for creds, owner in reversed(self.order[max(0, len(self.order) - k):])]
+
+    def percentile(self, q: float) -> int:
+        # creds of the wallet below which there is q of all wallets
+        self.refresh()
+        return self.order[int((len(self.order) - 1) * q)][0]
+
+    def top_share(self, fraction: float = 0.1) -> float:
+        self.refresh()
+        if self.total == 0:
+            return 0.0
+        return sum(creds for _, creds in self.richest(max(1, round(len(self.order) * fraction)))) / self.total
+
+    def gini(self) -> float:
+        self.refresh()
+        return sorted_gini([creds for creds, _ in self.order], self.total)
+
+
+def sorted_gini(values: List[int], total: int) -> float:
+    # gini coefficient of values sorted from the poorest, in one pass
+    if len(values) == 0 or total == 0:
+        return 0.0
+    weighted = sum((i + 1) * value for i, value in enumerate(values))
+    return 2 * weighted / (len(values) * total) - (len(values) + 1) / len(values)
+
+
+@icontract.invariant(lambda self: self.held >= 0, "Ledger cannot hold negative money")
+class Ledger:
+    # Every credit and debit of a wallet goes through the ledger so the amount of money in the world can be checked
+    # by comparing counters. Money held is taken out of wallets but not yet given back (locked in orders, collected
+    # taxes). Wallets with an owner are kept in the wealth index.
+    def __init__(self, in_wallets: int = 0, held: int = 0):
+        self.issued = in_wallets + held
+        self.in_wallets = in_wallets
+        self.held = held
+        self.wealth = WealthIndex()
+
+    def __str__(self):
+        return f"Ledger: {self.in_wallets}cr in wallets, {self.held}cr held ({self.issued}cr issued)"
+
+    def is_balanced(self) -> bool:
+        return self.in_wallets + self.held == self.issued
+
+    def open(self, wallet: Wallet):
+        # money of a new wallet comes into the world with it
+        self.issued += wallet.money.creds
+        self.in_wallets += wallet.money.creds
+        self.changed(wallet)
+
+    def close(self, wallet: Wallet):
+        # wallet of a deleted entity, its money has to be given away before
+        if wallet.owner is not None:
+            self.wealth.remove(wallet.owner)
+
+    def hold(self, wallet: Wallet, amount: Money):
+        wallet.money -= amount
+        self.in_wallets -= amount.creds
+        self.held += amount.creds
+        self.changed(wallet)
+
+    def release(self, wallet: Wallet, amount: Money):
+        wallet.money += amount
+        self.in_wallets += amount.creds
+        self.held -= amount.creds
+        self.changed(wallet)
+
+    def transfer(self, payer: Wallet, payee: Wallet, amount: Money):
+        payer.money -= amount
+        payee.money += amount
+        self.changed(payer)
+        self.changed(payee)
+
+    def redistribute(self, wallets: List[Wallet], tax_rate: float, shares: int) -> Money:
+        # taxes of all wallets are split into shares, every wallet gets one and the last one also what is left. Gives
+        # the same money as holding every tax and releasing the shares, but every wallet changes once.
+        taxes = [int(wallet.money.creds * tax_rate) for wallet in wallets]
+        collected = sum(taxes)
+        ubi = int(collected * (1 / shares))
+        for wallet, tax in zip(wallets, taxes):
+            wallet.money = Money(wallet.money.creds - tax + ubi)
+            self.changed(wallet)
+        if len(wallets) > 0:
+            wallets[-1].money = Money(wallets[-1].money.creds + collected - ubi * len(wallets))
+            self.changed(wallets[-1])
+        return Money(ubi)
+
+    def changed(self, wallet: Wallet):
+        if wallet.owner is not None:
+            self.wealth.add(wallet.owner, wallet.money.creds)
+
+    def audit(self, world):
+        in_wallets = total_money_in_wallets(world).creds
+        held = total_money_locked_in_orders(world).creds
+        if in_wallets != self.in_wallets or held != self.held:
+            raise Exception(
+                f"Money in the world does not match the ledger. Counted {in_wallets}cr in wallets and {held}cr in orders, {self}")
+
+
+def ledger_for(world) -> Ledger:
+    ledgers = world.get_component(Ledger)
+    if len(ledgers) > 0:
+        return ledgers[0][1]
+    # world was not created with a ledger, it starts with whatever money there is now
+    ledger = Ledger(total_money_in_wallets(world).creds, total_money_locked_in_orders(world).creds)
+    for ent, wallet in world.get_component(Wallet):
+        if wallet.owner is not None:
+            ledger.changed(wallet)
+    world.create_entity(ledger)
+    return ledger
+
+
+def total_money_in_wallets(world) -> Money:
+    wallets = world.get_component(Wallet)
+    return Money(sum([w.money.creds for ent, w in wallets]))
+
+
+def total_money_locked_in_orders(world) -> Money:
+    buy_orders = world.get_component(BuyOrder)
+    return Money(sum([o.price.creds * o.remaining() for ent, o in buy_orders if o.status == OrderStatus.UNPROCESSED]))
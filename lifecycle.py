@@ -0,0 +1,55 @@
+import icontract as icontract
+
+import esper  # type: ignore
+
+from cached_world import add_later
+from components import Details, Storage, Consumer, Producer, Wallet, Resource, InheritancePool, Terminated
+from instrumentation import count
+from ledger import ledger_for
+from log import log
+from processors import consume, grow_clone, die_of_hunger, draw_lottery
+
+
+class Lifecycle(esper.Processor):
+    # Consumption, Maturity, Death, InheritanceLottery and WealthRedistribution in one processor, with the same steps
+    # in the same order, so clones and lottery draw the same random numbers. People are visited once to consume and
+    # the hungry die without a Hunger marker, only producers are searched for grown humans (nobody else makes or buys
+    # them), and the living are taxed and paid the UBI by one change of their wallets.
+    def __init__(self, tax_rate: float = 0):
+        super().__init__()
+        self.tax_rate = tax_rate
+
+    @icontract.snapshot(lambda self: ledger_for(self.world).in_wallets, name="in_wallets")
+    @icontract.ensure(lambda OLD, self: ledger_for(self.world).in_wallets == OLD.in_wallets,
+                      "Lifecycle should not change the amount of money")
+    @icontract.ensure(lambda self: ledger_for(self.world).is_balanced())
+    def process(self):
+        log.debug("\nConsumption Phase started.")
+        hungry = [(ent, details, storage) for ent, (details, storage, consumer)
+                  in self.world.get_components(Details, Storage, Consumer) if consume(ent, details, storage, consumer)]
+        clones = 0
+        for ent, (details, storage, _) in self.world.get_components(Details, Storage, Producer):
+            if storage.has_one(Resource.GROWN_HUMAN):
+                grow_clone(self.world, details, storage)
+                clones += 1
+        count(self, "clones", clones)
+        pools = self.world.get_components(Storage, Wallet, InheritancePool)
+        dead = set()
+        for _, (pool_storage, pool_wallet, _) in pools:
+            for ent, details, storage in hungry:
+                if ent not in dead:
+                    die_of_hunger(self.world, details, storage, self.world.component_for_entity(ent, Wallet),
+                                  pool_storage, pool_wallet)
+                    add_later(self.world, ent, Terminated())
+                    dead.add(ent)
+            log.debug("Inheritance pool contents: %s and %s", pool_wallet.money, pool_storage)
+        count(self, "deaths", len(dead))
+        for _, (pool_storage, pool_wallet, _) in pools:
+            if pool_wallet.money.creds > 0:
+                draw_lottery(self.world, pool_wallet, dead.__contains__)
+                log.debug("Inheritance pool contents: %s and %s", pool_wallet.money, pool_storage)
+        # Terminated wallets are deleted by Cleanup every tick, so the only ones left are those who died above
+        wallets = self.world.get_component(Wallet)
+        living = [wallet for ent, wallet in wallets if ent not in dead]
+        ubi_value = ledger_for(self.world).redistribute(living, self.tax_rate, len(wallets))
+        log.info("Ubi this round is: %s", ubi_value)
@@ -1,3 +1,4 @@
+import json
 import logging, coloredlogs
 
 logging.basicConfig(
@@ -22,4 +23,47 @@ levelstyles = {'critical': {'bold': True, 'color': 'red'},
                'info': {'color': 'white'},
                'warning': {'color': 'yellow'}}
 
-coloredlogs.install(level=logging.INFO, logger=log, fmt='%(filename)s:%(lineno)s %(levelname)s %(message)s', field_styles=fieldstyle, level_styles=levelstyles)
\ No newline at end of file
+coloredlogs.install(level=logging.INFO, logger=log, fmt='%(filename)s:%(lineno)s %(levelname)s %(message)s', field_styles=fieldstyle, level_styles=levelstyles)
+
+# Messages about single agents are logged only for every sample_every-th entity
+sample_every = 1
+
+
+def set_sample_every(every: int):
+    global sample_every
+    sample_every = max(1, every)
+
+
+def debug_enabled() -> bool:
+    return log.isEnabledFor(logging.DEBUG)
+
+
+def info_enabled() -> bool:
+    return log.isEnabledFor(logging.INFO)
+
+
+def sampled(ent: int) -> bool:
+    # call before building debug messages about an agent, they are skipped when debug is off or agent is not sampled
+    return ent % sample_every == 0 and log.isEnabledFor(logging.DEBUG)
+
+
+# Structured events are written as json lines to a separate file, they are off until enable_events is called
+events = logging.getLogger(f"{__name__}.events")
+events.propagate = False
+events.setLevel(logging.CRITICAL + 1)
+
+
+def enable_events(path: str = "events.jsonl"):
+    handler = logging.FileHandler(path, mode="w")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    events.addHandler(handler)
+    events.setLevel(logging.INFO)
+
+
+def events_enabled() -> bool:
+    return events.isEnabledFor(logging.INFO)
+
+
+def event(kind: str, **fields):
+    if events.isEnabledFor(logging.INFO):
+        events.info(json.dumps({"event": kind, **fields}, default=str))
@@ -1,29 +1,47 @@
+import argparse
 import time
-from random import random
 
-import esper # type: ignore
-
-from components import StatsHistory, StarDate, Storage, Wallet, InheritancePool, Money, Details
-from entities import create_person, create_farm, create_well, create_cloning_center
+import checkpoint
+from components import StatsHistory, StarDate, Storage, InheritancePool, Details, RandomStream
+from globals import random_for
+from entities import create_person, create_farm, create_well, create_cloning_center, open_wallet
+from ledger import Ledger
+from order_pool import OrderPool
+from log import log, set_sample_every, enable_events
 from processors import TurnSummaryProcessor, Consumption, Production, Ordering, Exchange, OrderCancellation, Timeflow, \
-    Death, InheritanceLottery, Cleanup, WealthRedistribution, Maturity
+    Death, InheritanceLottery, Cleanup, WealthRedistribution, Maturity, Flush
+from instrumentation import InstrumentedWorld
+from metrics_server import MetricsServer, MetricsPublisher
+from runner import run_batch
+from transaction_logger import TICKER_FORMATS
+from vectorized_exchange import VectorizedExchange
+from vectorized_production import VectorizedProduction
+from lifecycle import Lifecycle
 
 
-def createManyEntities(world):
-    for i in range(100):
-        create_person(world, f"MAN-{i}", food_consumption=0.5, food_amount=int(random()*10)+2, water_amount=3, water_consumption=0.25,
-                      money=1000)
-    for i in range(60):
-        create_farm(world, f"Farm-{i}", labour_consumption=1, food_production=2, food_storage=5, money=1500)
-    for i in range(30):
-        create_well(world, f"Well-{i}", labour_consumption=1, water_production=2, water_storage=5, money=1000)
+def createManyEntities(world, scale: float = 1, food_consumption=0.5, water_consumption=0.25, food_production=2,
+                       water_production=2):
+    # scale multiplies number of all entities keeping their ratios
+    rng = random_for(world)
+    for i in range(max(1, round(100 * scale))):
+        create_person(world, f"MAN-{i}", food_consumption=food_consumption, food_amount=int(rng.random()*10)+2, water_amount=3,
+                      water_consumption=water_consumption, money=1000)
+    for i in range(max(1, round(60 * scale))):
+        create_farm(world, f"Farm-{i}", labour_consumption=1, food_production=food_production, food_storage=5, money=1500)
+    for i in range(max(1, round(30 * scale))):
+        create_well(world, f"Well-{i}", labour_consumption=1, water_production=water_production, water_storage=5,
+                    money=1000)
 
-    for i in range(3):
+    for i in range(max(1, round(3 * scale))):
         create_cloning_center(world, f"Clone Center-{i}", 5, 5, 1500)
 
+# people, farms, wells and cloning centers created by createManyEntities
+MANY_ENTITIES_AGENTS = 100 + 60 + 30 + 3
+
 def createFewEntities(world):
+    rng = random_for(world)
     for name in ["Jacek", "Wacek", "Placek", "Gacek", "Macek", "Lacek", "Picek", "XXX", "YYY"]:
-        create_person(world, f"{name}", food_consumption=0.5, food_amount=int(random()*10), water_amount=3, water_consumption=0.25,
+        create_person(world, f"{name}", food_consumption=0.5, food_amount=int(rng.random()*10), water_amount=3, water_consumption=0.25,
                       money=1000)
     for name in ["Folwark", "Kołko Rolnicze"]:
         create_farm(world, f"{name}", labour_consumption=1, food_production=1, food_storage=10, money=1500)
@@ -41,41 +59,118 @@ def create2Entities(world):
     create_cloning_center(world, "Clone Center", 5, 5, 1500)
 
 
-def createGlobalEntities(world):
+def createGlobalEntities(world, seed=None, stats_window=StarDate.TURNS_IN_YEAR, stats_spill=None,
+                         order_pool_capacity=None):
     globals = world.create_entity()
+    world.add_component(globals, RandomStream(seed))
     world.add_component(globals, StarDate())
-    world.add_component(globals, StatsHistory())
+    world.add_component(globals, StatsHistory(stats_window, stats_spill))
+    world.add_component(globals, Ledger())
+    world.add_component(globals, OrderPool(order_pool_capacity))
     inheritance_pool = world.create_entity()
     world.add_component(inheritance_pool, Details("Insurance Pool"))
     world.add_component(inheritance_pool, Storage())
-    world.add_component(inheritance_pool, Wallet(Money(0)))
+    # money in the pool belongs to nobody, it is not in the wealth index
+    world.add_component(inheritance_pool, open_wallet(world, 0))
     world.add_component(inheritance_pool, InheritancePool())
 
-def init():
-    new_world = esper.World()
-    #create2Entities(new_world)
-    #createFewEntities(new_world)
-    createManyEntities(new_world)
-    createGlobalEntities(new_world)
-    new_world.add_processor(Timeflow())
-    new_world.add_processor(Production())
+SCENARIOS = {
+    "two": create2Entities,
+    "few": createFewEntities,
+    "many": createManyEntities,
+}
+
+
+def init(scenario=createManyEntities, vectorized_exchange=False, audit_every=StarDate.TURNS_IN_YEAR,
+         ticker_path="ticker.csv", tax_rate=0.1, seed=None, stats_window=StarDate.TURNS_IN_YEAR, stats_spill=None,
+         ticker_format="csv", metrics_server=None, order_pool_capacity=None, vectorized_production=False,
+         fused_lifecycle=False):
+    # seed: runs with the same seed are the same, without it a random one is used
+    new_world = InstrumentedWorld()
+    # global entities go first so that the ledger knows about all wallets
+    createGlobalEntities(new_world, seed, stats_window, stats_spill, order_pool_capacity)
+    scenario(new_world)
+    new_world.add_processor(Timeflow(audit_every))
+    new_world.add_processor(VectorizedProduction() if vectorized_production else Production())
     new_world.add_processor(Ordering())
-    new_world.add_processor(Exchange())
+    new_world.add_processor(VectorizedExchange() if vectorized_exchange else Exchange())
     new_world.add_processor(OrderCancellation())
-    new_world.add_processor(Consumption())
-    new_world.add_processor(Maturity())
-    new_world.add_processor(Death())
-    new_world.add_processor(InheritanceLottery())
-    new_world.add_processor(WealthRedistribution(0.1))
-    new_world.add_processor(TurnSummaryProcessor())
+    if fused_lifecycle:
+        new_world.add_processor(Lifecycle(tax_rate))
+        # cancelled orders, hungry and dead people are marked in one go
+        new_world.add_processor(Flush())
+    else:
+        new_world.add_processor(Consumption())
+        # hungry people and cancelled orders are marked in one go
+        new_world.add_processor(Flush())
+        new_world.add_processor(Maturity())
+        new_world.add_processor(Death())
+        # the dead are marked before the lottery and taxes skip them
+        new_world.add_processor(Flush())
+        new_world.add_processor(InheritanceLottery())
+        new_world.add_processor(WealthRedistribution(tax_rate))
+    new_world.add_processor(TurnSummaryProcessor(ticker_path, ticker_format))
+    if metrics_server is not None:
+        new_world.add_processor(MetricsPublisher(metrics_server))
     new_world.add_processor(Cleanup())
     return new_world
 
 
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description="Space business simulation. Without --ticks or --budget it runs one "
+                                                 "tick every time enter is pressed.")
+    parser.add_argument("--scenario", choices=SCENARIOS.keys(), default="many", help="which entities to create")
+    parser.add_argument("--ticks", type=int, help="run this many ticks without waiting for input")
+    parser.add_argument("--budget", type=float, help="run without waiting for input until this many seconds pass")
+    parser.add_argument("--vectorized-exchange", action="store_true", help="clear the exchange with numpy")
+    parser.add_argument("--vectorized-production", action="store_true",
+                        help="compute batches of all producers at once with numpy")
+    parser.add_argument("--fused-lifecycle", action="store_true",
+                        help="consume, die, inherit and pay taxes in one processor with fewer passes over everyone")
+    parser.add_argument("--audit-every", type=int, default=StarDate.TURNS_IN_YEAR,
+                        help="count all money in the world every this many ticks, 0 turns it off")
+    parser.add_argument("--processors-csv", default="processors.csv",
+                        help="where to save timings and counters of processors from recent ticks in batch mode")
+    parser.add_argument("--checkpoint-every", type=int, help="save the world every this many ticks in batch mode")
+    parser.add_argument("--checkpoint", default="checkpoint.bin", help="where to save the world")
+    parser.add_argument("--restore", help="continue from a saved world instead of creating a scenario")
+    parser.add_argument("--stats-window", type=int, default=StarDate.TURNS_IN_YEAR,
+                        help="days of price stats kept in memory")
+    parser.add_argument("--stats-spill", help="file to which older price stats are appended, without it they are dropped")
+    parser.add_argument("--ticker", default="ticker.csv", help="where to save prices of every day")
+    parser.add_argument("--ticker-format", choices=TICKER_FORMATS, default="csv",
+                        help="binary ticker has fixed size rows of int64 numbers, read it with read_binary_ticker")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve metrics of every tick at http://127.0.0.1:PORT/metrics and /stream")
+    parser.add_argument("--seed", type=int, help="runs with the same seed are the same")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--log-sample-every", type=int, default=1,
+                        help="log debug messages about every this many agents only")
+    parser.add_argument("--events", help="save deaths, clones, lottery wins and market summaries to this json lines file")
+    return parser.parse_args(arguments)
+
+
 if __name__ == '__main__':
-    world = init()
+    arguments = parse_arguments()
+    log.setLevel(arguments.log_level)
+    set_sample_every(arguments.log_sample_every)
+    if arguments.events is not None:
+        enable_events(arguments.events)
+    scenario = SCENARIOS[arguments.scenario] if arguments.restore is None else lambda world: None
+    metrics_server = MetricsServer(port=arguments.metrics_port).start() if arguments.metrics_port is not None else None
+    world = init(scenario, arguments.vectorized_exchange, arguments.audit_every, seed=arguments.seed,
+                 stats_window=arguments.stats_window, stats_spill=arguments.stats_spill, ticker_path=arguments.ticker,
+                 ticker_format=arguments.ticker_format, metrics_server=metrics_server,
+                 vectorized_production=arguments.vectorized_production, fused_lifecycle=arguments.fused_lifecycle)
+    if arguments.restore is not None:
+        checkpoint.load(world, arguments.restore)
+    log.info("Random seed: %s", random_for(world).initial_seed)
 
-    while True:
-        world.process()
-        input()
-        #time.sleep(1)
+    if arguments.ticks is not None or arguments.budget is not None:
+        print(run_batch(world, arguments.ticks, arguments.budget, arguments.checkpoint_every, arguments.checkpoint))
+        world.instrumentation.to_csv(arguments.processors_csv)
+    else:
+        while True:
+            world.process()
+            input()
+            #time.sleep(1)
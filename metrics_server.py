@@ -0,0 +1,154 @@
+import json
+import queue
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional
+
+import esper  # type: ignore
+
+from components import Resource, Consumer, Terminated, StatsForDay, DAY_STATS, STAT_FIELDS
+from globals import star_date_for, stats_history_for
+from ledger import ledger_for
+from log import log
+
+
+class MetricsServer:
+    # Serves metrics of the last tick at /metrics and a json line for every tick at /stream. Requests are handled on
+    # their own threads, every streaming client has a bounded queue and loses its oldest ticks when it reads too slowly,
+    # so clients never make the simulation wait.
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, client_queue: int = 100):
+        self.client_queue = client_queue
+        self.latest: Optional[Dict] = None
+        self.clients: List[queue.Queue] = []
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.server = ThreadingHTTPServer((host, port), metrics_handler(self))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics server", daemon=True)
+
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MetricsServer':
+        self.thread.start()
+        log.info("Serving metrics at %s/metrics and %s/stream", self.address(), self.address())
+        return self
+
+    def close(self):
+        self.stopping.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def publish(self, metrics: Dict):
+        # called on the tick thread, never blocks
+        with self.lock:
+            self.latest = metrics
+            clients = list(self.clients)
+        for client in clients:
+            while True:
+                try:
+                    client.put_nowait(metrics)
+                    break
+                except queue.Full:
+                    try:
+                        client.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def subscribe(self) -> queue.Queue:
+        client: queue.Queue = queue.Queue(maxsize=self.client_queue)
+        with self.lock:
+            self.clients.append(client)
+        return client
+
+    def unsubscribe(self, client: queue.Queue):
+        with self.lock:
+            self.clients.remove(client)
+
+
+def metrics_handler(metrics_server: MetricsServer):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                self.send_json(metrics_server.latest)
+            elif self.path == "/stream":
+                self.stream()
+            else:
+                self.send_error(404, "Use /metrics or /stream")
+
+        def send_json(self, metrics):
+            body = json.dumps(metrics).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def stream(self):
+            client = metrics_server.subscribe()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                while not metrics_server.stopping.is_set():
+                    try:
+                        metrics = client.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    self.wfile.write(json.dumps(metrics).encode() + b"\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                metrics_server.unsubscribe(client)
+
+        def log_message(self, format, *args):
+            log.debug("Metrics client %s: " + format, self.address_string(), *args)
+
+    return MetricsHandler
+
+
+def stats_as_dict(stats: StatsForDay) -> Dict:
+    result = {}
+    for name in DAY_STATS:
+        stat = getattr(stats, name)
+        result[name] = {field: stat.length if field == "length" else creds(getattr(stat, field)) for field in STAT_FIELDS}
+    return result
+
+
+def creds(money):
+    return money.creds if money is not None else None
+
+
+class MetricsPublisher(esper.Processor):
+    # Publishes metrics at the end of every tick, processor timings are the ones of the previous (complete) tick
+    def __init__(self, server: MetricsServer):
+        super().__init__()
+        self.server = server
+
+    def process(self):
+        star_date, stats_history = star_date_for(self.world), stats_history_for(self.world)
+        metrics = {
+            "time": star_date.time,
+            "date": str(star_date),
+            "money": ledger_for(self.world).in_wallets,
+            "population": self.population(),
+            "gini": ledger_for(self.world).wealth.gini(),
+            "top_10_share": ledger_for(self.world).wealth.top_share(0.1),
+            "prices": {resource.name: stats_as_dict(stats_history.stats_for_day(star_date, resource))
+                       for resource in Resource if stats_history.has_stats_for_day(star_date, resource)},
+        }
+        instrumentation = getattr(self.world, "instrumentation", None)
+        if instrumentation is not None:
+            current = instrumentation.last(2)
+            death = current[-1].processors.get("Death") or current[-1].processors.get("Lifecycle")
+            metrics["deaths"] = death.counters.get("deaths", 0) if death is not None else 0
+            if len(current) == 2:
+                metrics["processors"] = {name: {"wall_time": sample.wall_time, **sample.counters}
+                                         for name, sample in current[0].processors.items()}
+        self.server.publish(metrics)
+
+    def population(self) -> int:
+        # people who died this tick are deleted during cleanup, they are not counted anymore
+        return len(self.world.get_component(Consumer)) - len(self.world.get_components(Consumer, Terminated))
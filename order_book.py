@@ -0,0 +1,125 @@
+from collections import namedtuple
+from typing import Dict, List, Tuple
+
+from sortedcontainers import SortedKeyList  # type: ignore
+
+from components import Resource, BuyOrder, SellOrder
+
+Fill = namedtuple('Fill', ['buy_order', 'sell_order', 'amount'])
+
+
+def order_price(entry) -> int:
+    _, order = entry
+    return order.price.creds
+
+
+class OrderBook:
+    def __init__(self, resource: Resource):
+        self.resource = resource
+        # orders with the same price keep the order in which they were added
+        self.bids = SortedKeyList(key=order_price)
+        self.asks = SortedKeyList(key=order_price)
+
+    @staticmethod
+    def for_orders(buy_orders, sell_orders) -> Dict[Resource, 'OrderBook']:
+        books: Dict[Resource, OrderBook] = {}
+        for ent, order in buy_orders:
+            if order.resource not in books:
+                books[order.resource] = OrderBook(order.resource)
+            books[order.resource].add_bid(ent, order)
+        for ent, order in sell_orders:
+            if order.resource not in books:
+                books[order.resource] = OrderBook(order.resource)
+            books[order.resource].add_ask(ent, order)
+        return books
+
+    def add_bid(self, ent, order: BuyOrder):
+        if order.remaining() > 0:
+            self.bids.add((ent, order))
+
+    def add_ask(self, ent, order: SellOrder):
+        if order.remaining() > 0:
+            self.asks.add((ent, order))
+
+    def match_orders(self) -> Tuple[List[Tuple[BuyOrder, int]], List[Tuple[SellOrder, int]]]:
+        # Returns (order, units) of buy and sell orders sorted by price. The highest buy units are paired with the
+        # cheapest sell units (see pair_orders), each pair has a buy price at least as high as the sell price.
+        if len(self.bids) == 0 or len(self.asks) == 0:
+            return [], []
+        max_bid = order_price(self.bids[-1])
+        min_ask = order_price(self.asks[0])
+        asks = [(order, order.remaining()) for _, order in self.asks.irange_key(max_key=max_bid)]
+        bids = [(order, order.remaining()) for _, order in self.bids.irange_key(min_key=min_ask)]
+        return without_lowest_units(bids, lowest_units_to_drop(bids, asks)), asks
+
+    def __str__(self):
+        return f"OrderBook: {self.resource} #B {len(self.bids)} #S {len(self.asks)}"
+
+
+def pair_orders(buy_orders: List[Tuple[BuyOrder, int]], sell_orders: List[Tuple[SellOrder, int]]) -> List[Fill]:
+    bought = sum(units for _, units in buy_orders)
+    sold = sum(units for _, units in sell_orders)
+    return [Fill(buy_orders[b][0], sell_orders[s][0], units)
+            for b, s, units in paired_units(buy_orders, sell_orders, max(0, bought - sold))]
+
+
+def paired_units(bids, asks, offset: int):
+    # Pairs bid units starting from offset with ask units starting from the cheapest one.
+    # Yields (bid index, ask index, units) for every run of units shared by the same two orders.
+    b = 0
+    while b < len(bids) and offset >= bids[b][1]:
+        offset -= bids[b][1]
+        b += 1
+    if b == len(bids) or len(asks) == 0:
+        return
+    a = 0
+    bid_left, ask_left = bids[b][1] - offset, asks[a][1]
+    while True:
+        units = min(bid_left, ask_left)
+        yield b, a, units
+        bid_left -= units
+        ask_left -= units
+        if bid_left == 0:
+            b += 1
+            if b == len(bids):
+                return
+            bid_left = bids[b][1]
+        if ask_left == 0:
+            a += 1
+            if a == len(asks):
+                return
+            ask_left = asks[a][1]
+
+
+def lowest_units_to_drop(bids, asks) -> int:
+    # Bids and asks are (order, units) sorted by price. Once the cheapest bid units are dropped the remaining ones are
+    # paired from the top with the cheapest asks. Dropping more units never breaks a valid pairing so the smallest drop
+    # is binary searched.
+    n = sum(units for _, units in bids)
+    m = sum(units for _, units in asks)
+
+    def pairs_are_valid(dropped):
+        return all(bids[b][0].price >= asks[a][0].price for b, a, _ in paired_units(bids, asks, max(dropped, n - m)))
+
+    low = max(0, n - m)
+    if pairs_are_valid(low):
+        return 0
+    high = n
+    while high - low > 1:
+        middle = (low + high) // 2
+        if pairs_are_valid(middle):
+            high = middle
+        else:
+            low = middle
+    return high
+
+
+def without_lowest_units(orders, dropped: int):
+    kept = []
+    for order, units in orders:
+        if dropped >= units:
+            dropped -= units
+        else:
+            kept.append((order, units - dropped))
+            dropped = 0
+    return kept
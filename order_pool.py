@@ -0,0 +1,31 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+from components import BuyOrder, SellOrder, Money, Resource
+
+Order = Union[BuyOrder, SellOrder]
+
+
+class OrderPool:
+    # Entities and components of deleted orders, new orders take them instead of creating new ones so that the world
+    # does not get new entity ids and objects every tick. Free orders are not in the world, so they are not saved in
+    # checkpoints either. capacity limits free orders of every type, 0 turns pooling off.
+    def __init__(self, capacity: Optional[int] = None):
+        self.capacity = capacity
+        self.free: Dict[type, List[Tuple[int, Order]]] = {BuyOrder: [], SellOrder: []}
+
+    def create(self, world, order_type: type, owner: int, resource: Resource, price: Money, amount: int = 1) -> Order:
+        free = self.free[order_type]
+        if len(free) > 0:
+            ent, order = free.pop()
+            order.__init__(owner, resource, price, amount)
+        else:
+            ent, order = world.create_entity(), order_type(owner, resource, price, amount)
+        world.add_component(ent, order)
+        return order
+
+    def release(self, ent: int, order: Order):
+        # the order entity has to be deleted from the world, deleted entities are cleared at the start of next tick,
+        # before any order can take it again
+        free = self.free[type(order)]
+        if self.capacity is None or len(free) < self.capacity:
+            free.append((ent, order))
@@ -1,32 +1,37 @@
-from random import random, choice, randint
-from typing import Tuple, Union, List
-from log import log
+import math
+from typing import Callable, Union, List, Dict, Optional
+from log import log, debug_enabled, info_enabled, sampled, event, events_enabled
 
 import esper  # type: ignore
-import statistics
 
 import icontract as icontract
 
 from components import Storage, Consumer, Details, Producer, SellOrder, ResourcePile, BuyOrder, Wallet, Resource, \
-    Needs, OrderStatus, Need, Money, Hunger, InheritancePool, Terminated
+    Needs, OrderStatus, Need, Money, Hunger, InheritancePool, Terminated, MarketStats, StatsHistory, StarDate, NO_LIMIT
 from entities import create_person
+from cached_world import CachedWorld, add_later, delete_later
+from instrumentation import count
+from ledger import ledger_for
+from order_book import OrderBook, Fill, pair_orders
 from transaction_logger import Ticker
-import globals
+from globals import star_date_for, stats_history_for, random_for, order_pool_for
 
 
 class Timeflow(esper.Processor):
-    def __init__(self):
+    def __init__(self, audit_every: int = 1):
+        # audit_every: how many turns pass between counting all the money in the world, 0 turns audits off
         super().__init__()
-        self.total_money_at_start = None
+        self.audit_every = audit_every
 
     def process(self):
-        globals.star_date.increase()
-        log.info(f"It is now {globals.star_date}. Total money: {total_money_in_wallets(self.world)}")
-        if self.total_money_at_start is None:
-            self.total_money_at_start = total_money_in_wallets(self.world)
-        if self.total_money_at_start.creds != total_money_in_wallets(self.world).creds:
-            raise Exception(
-                f"Total money changed from {self.total_money_at_start} to {total_money_in_wallets(self.world)}. (diff {self.total_money_at_start.creds - total_money_in_wallets(self.world).creds}cr)")
+        star_date = star_date_for(self.world)
+        star_date.increase()
+        ledger = ledger_for(self.world)
+        log.info("It is now %s. Total money: %scr", star_date, ledger.in_wallets)
+        if not ledger.is_balanced():
+            raise Exception(f"Total money changed, {ledger}. (diff {ledger.issued - ledger.in_wallets - ledger.held}cr)")
+        if self.audit_every > 0 and star_date.time % self.audit_every == 0:
+            ledger.audit(self.world)
 
 
 class Consumption(esper.Processor):
@@ -34,20 +39,27 @@ class Consumption(esper.Processor):
         super().__init__()
 
     def process(self):
-        def consume_if_possible(ent, storage: Storage, pile: ResourcePile):
-            if storage.has_at_least(pile):
-                storage.remove(pile)
-                log.debug(f"Removed {pile} from {details.name}")
-            else:
-                log.debug(f"Consumer {details.name} did not have {pile} and will suffer consequences")
-                if pile.resource_type == Resource.FOOD:
-                    self.world.add_component(ent, Hunger())
-
         log.debug("\nConsumption Phase started.")
         consumers = self.world.get_components(Details, Storage, Consumer)
         for ent, (details, storage, consumer) in consumers:
-            for need in consumer.needs:
-                consume_if_possible(ent, storage, need)
+            if consume(ent, details, storage, consumer):
+                add_later(self.world, ent, Hunger())
+
+
+def consume(ent, details: Details, storage: Storage, consumer: Consumer) -> bool:
+    # removes every need the consumer has enough for, True when it went without food
+    hungry = False
+    for need in consumer.needs:
+        if storage.has_at_least(need):
+            storage.remove(need)
+            if sampled(ent):
+                log.debug("Removed %s from %s", need, details.name)
+        else:
+            if sampled(ent):
+                log.debug("Consumer %s did not have %s and will suffer consequences", details.name, need)
+            if need.resource_type == Resource.FOOD:
+                hungry = True
+    return hungry
 
 
 class Production(esper.Processor):
@@ -55,17 +67,47 @@ class Production(esper.Processor):
         super().__init__()
 
     def process(self):
-        log.debug(f"\nProduction Phase started")
+        log.debug("\nProduction Phase started")
         producers = self.world.get_components(Details, Storage, Producer)
+        made = 0
         for ent, (details, storage, producer) in producers:
-            while storage.has_at_least(producer.needed_pile()) and storage.will_fit(producer.created_pile()):
-                storage.remove(producer.needed_pile())
-                storage.add(producer.created_pile())
-                log.debug(f"Producer {details.name} produced {producer.created_pile()}")
+            made += self.produce(ent, details, storage, producer, possible_batches(storage, producer))
+        count(self, "batches", made)
+
+    def produce(self, ent, details, storage: Storage, producer: Producer, batches: int) -> int:
+        if batches > 0:
+            needed, created = producer.needed_pile(), producer.created_pile()
+            # batches counted with BATCH_TOLERANCE may need a rounding error more than there is or fits
+            storage.remove(ResourcePile(needed.resource_type,
+                                        min(needed.amount * batches, storage.amount(needed.resource_type))))
+            storage.add_up_to_limit(ResourcePile(created.resource_type, created.amount * batches))
+            if sampled(ent):
+                log.debug("Producer %s produced %s batches of %s", details.name, batches, created)
+        if sampled(ent):
             if not storage.will_fit(producer.created_pile()):
-                log.debug(f"Producer {details.name} did not have place to hold {producer.created_pile()}")
+                log.debug("Producer %s did not have place to hold %s", details.name, producer.created_pile())
             if not storage.has_at_least(producer.needed_pile()):
-                log.debug(f"Producer {details.name} did not have {producer.needed_pile()} to start production")
+                log.debug("Producer %s did not have %s to start production", details.name, producer.needed_pile())
+        return batches
+
+
+# amounts like 0.1 are not exact in binary, 5.8 / 0.1 is 57.99999999999999 while 58 batches of 0.1 fit in 5.8
+BATCH_TOLERANCE = 1e-9
+
+
+def possible_batches(storage: Storage, producer: Producer) -> int:
+    # batches made when producing one at a time while there is enough input and space for the output, computed at once
+    needed, created = producer.needed_pile(), producer.created_pile()
+    if needed.resource_type == created.resource_type:
+        raise Exception(f"Producer of {created} cannot need the same resource")
+    limit = storage.limits[created.resource_type.slot]
+    by_input = math.floor(storage.amount(needed.resource_type) / needed.amount + BATCH_TOLERANCE) \
+        if needed.amount > 0 else None
+    by_space = math.floor((limit - storage.amount(created.resource_type)) / created.amount + BATCH_TOLERANCE) \
+        if created.amount > 0 and limit != NO_LIMIT else None
+    if by_input is None and by_space is None:
+        raise Exception(f"Producer of {created} from {needed} would never stop")
+    return max(0, min(batches for batches in (by_input, by_space) if batches is not None))
 
 
 class Ordering(esper.Processor):
@@ -77,214 +119,221 @@ class Ordering(esper.Processor):
         self.create_sell_orders()
         self.create_buy_orders()
 
-    def decide_order_price_for_buy(self, details: Details, need: Need, wallet: Wallet):
+    def decide_order_price_for_buy(self, details: Details, need: Need, wallet: Wallet, stats_history: StatsHistory,
+                                   yesterday: StarDate, verbose: bool = False):
         last_price, status = wallet.last_transaction_details_for(need.resource_type())
         if status is None:
-            bid_price = wallet.money.multiply(random() * 0.2)
-            log.debug(f"{details.name} knows nothing about prices of {need.resource_type()}. Guessing: {bid_price}")
+            bid_price = wallet.money.multiply(random_for(self.world).random() * 0.2)
+            if verbose:
+                log.debug("%s knows nothing about prices of %s. Guessing: %s", details.name, need.resource_type(), bid_price)
         else:
             if status == OrderStatus.BOUGHT:
                 bid_price = last_price.multiply(need.price_change_on_buy)
-                log.debug(
-                    f"{details.name} bought {need.resource_type()} for {last_price}. Will try to order for {bid_price}")
+                if verbose:
+                    log.debug("%s bought %s for %s. Will try to order for %s", details.name, need.resource_type(),
+                              last_price, bid_price)
             elif status == OrderStatus.CANCELLED:
-                if globals.stats_history.has_stats_for_day(globals.star_date.yesterday(), need.resource_type()):
+                if stats_history.has_stats_for_day(yesterday, need.resource_type()):
                     #yesterday_stats = globals.stats_history.stats_for_day(globals.star_date.yesterday(), need.resource_type())
                     #median = yesterday_stats.sell_stats.median
                     #bid_price = (median + last_price).split()[0] if median is not None else last_price
                     bid_price = max(last_price.multiply(need.price_change_on_failed_buy), last_price + Money(1))
-                    log.debug( f"{details.name} failed to buy {need.resource_type()} for {last_price}. Will try to order for {bid_price}")
+                    if verbose:
+                        log.debug("%s failed to buy %s for %s. Will try to order for %s", details.name,
+                                  need.resource_type(), last_price, bid_price)
                 else:
                     bid_price = last_price
-                    log.debug(
-                        f"{details.name} has no info about yesterday prices of {need.resource_type()}. Ordering for last price {last_price}")
+                    if verbose:
+                        log.debug("%s has no info about yesterday prices of %s. Ordering for last price %s",
+                                  details.name, need.resource_type(), last_price)
             else:
                 raise Exception(f"Unexpected transaction status: {status}")
         return max(bid_price, Money(1))
 
     def create_buy_orders(self):
-        def decide_to_place_buy_order(owner, resouce: Resource, wallet: Wallet, max_bid_price: Money):
+        def decide_to_place_buy_order(owner, resouce: Resource, wallet: Wallet, max_bid_price: Money) -> bool:
             if resouce == Resource.NOTHING:
-                log.debug(f"{details.name} won't buy nothing so not placing an order")
+                if verbose:
+                    log.debug("%s won't buy nothing so not placing an order", details.name)
             elif not storage.will_fit_one_of(resouce):
-                log.debug(f"{details.name} did not order {resouce} (no storage space left)")
+                if verbose:
+                    log.debug("%s did not order %s (no storage space left)", details.name, resouce)
             else:
-                if wallet.money < max_bid_price:
-                    log.debug(
-                        f"{details.name} did not affort {max_bid_price} to order {resouce}. Has only {wallet.money} left. Will bid for this amount instead")
+                if verbose and wallet.money < max_bid_price:
+                    log.debug("%s did not affort %s to order %s. Has only %s left. Will bid for this amount instead",
+                              details.name, max_bid_price, resouce, wallet.money)
                 bid = min(max_bid_price, wallet.money)
                 if wallet.money.creds > 0:
-                    wallet.money -= bid
-                    buy_order = create_buy_order(owner, resouce, bid)
-                    log.debug(f"{details.name} created a {buy_order}")
-                else:
-                    log.debug(f"{details.name} has no money left to create orders")
-
-        def create_buy_order(owner, resource: Resource, max_bid_price: Money) -> BuyOrder:
-            buy_order_ent = self.world.create_entity()
-            buy_order = BuyOrder(owner, resource, max_bid_price)
-            self.world.add_component(buy_order_ent, buy_order)
-            return buy_order
-
+                    ledger.hold(wallet, bid)
+                    buy_order = order_pool.create(self.world, BuyOrder, owner, resouce, bid)
+                    if verbose:
+                        log.debug("%s created a %s", details.name, buy_order)
+                    return True
+                elif verbose:
+                    log.debug("%s has no money left to create orders", details.name)
+            return False
+
+        ledger, order_pool = ledger_for(self.world), order_pool_for(self.world)
+        # global components are looked up once, not for every need
+        stats_history, yesterday = stats_history_for(self.world), star_date_for(self.world).yesterday()
+        placed = 0
         needers = self.world.get_components(Details, Storage, Needs, Wallet)
         for ent, (details, storage, needs, wallet) in needers:
+            verbose = sampled(ent)
             for need in needs:
                 if not need.is_fullfilled(storage):
-                    log.debug(f"{details.name} wants to {need.name}")
-                    bid_price = self.decide_order_price_for_buy(details, need, wallet)
-                    decide_to_place_buy_order(ent, need.pile.resource_type, wallet, bid_price)
-
-    def decide_order_price_for_sell(self, details, resource_type, wallet: Wallet) -> Money:
+                    if verbose:
+                        log.debug("%s wants to %s", details.name, need.name)
+                    bid_price = self.decide_order_price_for_buy(details, need, wallet, stats_history, yesterday,
+                                                                verbose)
+                    placed += decide_to_place_buy_order(ent, need.pile.resource_type, wallet, bid_price)
+        count(self, "buy_orders", placed)
+
+    def decide_order_price_for_sell(self, details, resource_type, wallet: Wallet, verbose: bool = False) -> Money:
         last_price, status = wallet.last_transaction_details_for(resource_type)
         if status is None:
-            bid_price = Money(int(random() * 200 + 50))
-            log.debug(f"{details.name} knows nothing about prices of {resource_type}. Guessing: {bid_price}")
+            bid_price = Money(int(random_for(self.world).random() * 200 + 50))
+            if verbose:
+                log.debug("%s knows nothing about prices of %s. Guessing: %s", details.name, resource_type, bid_price)
         else:
             if status == OrderStatus.SOLD:
                 # TODO Should be handled more in a way as needs are
                 # don't get stuck at small values
                 bid_price = max(last_price.multiply(1.1), last_price + Money(1))
-                log.debug(
-                    f"{details.name} sold {resource_type} for {last_price}. Will try to sell for {bid_price}")
+                if verbose:
+                    log.debug("%s sold %s for %s. Will try to sell for %s", details.name, resource_type, last_price,
+                              bid_price)
             elif status == OrderStatus.CANCELLED:
                 bid_price = last_price.multiply(0.9)
-                log.debug(
-                    f"{details.name} failed to sell {resource_type} for {last_price}. Will try to sell for {bid_price}")
+                if verbose:
+                    log.debug("%s failed to sell %s for %s. Will try to sell for %s", details.name, resource_type,
+                              last_price, bid_price)
             else:
                 raise Exception(f"Unexpected transaction status: {status}")
         return max(bid_price, Money(
             1))  # TODO make it more sensible, wallet should take all transactions from last turn into account
 
     def create_sell_orders(self):
-        def create_sell_order(owner, resource: Resource, min_bid_price: Money) -> SellOrder:
-            sell_order_ent = self.world.create_entity()
-            sell_order = SellOrder(owner, resource, min_bid_price)
-            self.world.add_component(sell_order_ent, sell_order)
-            return sell_order
-
+        order_pool = order_pool_for(self.world)
+        placed = 0
         producers = self.world.get_components(Details, Storage, Producer, Wallet)
         for ent, (details, storage, producer, wallet) in producers:
-            while storage.has_one_of(producer.created_pile()):
-                storage.remove_one_of(producer.created_pile())
-                bid_price = self.decide_order_price_for_sell(details, producer.created_pile().resource_type, wallet)
-                sell_order = create_sell_order(ent, producer.created_pile().resource_type, bid_price)
-                log.debug(f"{details.name} created a {sell_order}")
-            log.debug(f"{details.name} won't sell {producer.created_pile().resource_type} as it does not have enough of it")
+            verbose = sampled(ent)
+            resource_type = producer.created_pile().resource_type
+            # only whole units are sold, all of them in one order
+            units = int(storage.amount(resource_type))
+            if units > 0:
+                storage.remove(ResourcePile(resource_type, units))
+                bid_price = self.decide_order_price_for_sell(details, resource_type, wallet, verbose)
+                sell_order = order_pool.create(self.world, SellOrder, ent, resource_type, bid_price, units)
+                placed += 1
+                if verbose:
+                    log.debug("%s created a %s", details.name, sell_order)
+            elif verbose:
+                log.debug("%s won't sell %s as it does not have enough of it", details.name, resource_type)
+        count(self, "sell_orders", placed)
 
 
 class Exchange(esper.Processor):
     def __init__(self):
         super().__init__()
 
-    def create_order_pairs(self, buy_orders, sell_orders):
-        if len(sell_orders) < len(buy_orders):
-            order_pairs = zip(buy_orders[len(buy_orders) - len(sell_orders):], sell_orders)
-        else:
-            order_pairs = zip(buy_orders, sell_orders[:len(buy_orders)])
-        return order_pairs
-
-    @icontract.snapshot(lambda self: self)
-    @icontract.ensure(lambda OLD, self: total_money_locked_in_orders(self.world) + total_money_in_wallets(self.world) == total_money_locked_in_orders(OLD.self.world) + total_money_in_wallets(OLD.self.world))
+    @icontract.ensure(lambda self: ledger_for(self.world).is_balanced())
     def process(self):
-        def order_pairs_are_valid(buy_orders, sell_orders):
-            for buy, sell in self.create_order_pairs(buy_orders, sell_orders):
-                _, buy_order = buy
-                _, sell_order = sell
-                if buy_order.price < sell_order.price:
-                    log.debug(f"Order Pair: {buy_order} / {sell_order} is invalid.")
-                    return False
-            return True
-
-        def fix_orders(buy, sell):
-            log.debug("Fixing orders")
-            return buy[1:], sell
-
         log.debug("\nExchange Phase started.")
         sell_orders = self.world.get_component(SellOrder)
         buy_orders = self.world.get_component(BuyOrder)
-        self.report_orders(sell_orders, "sell orders")
-        self.report_orders(buy_orders, " buy orders")
+        if debug_enabled():
+            self.report_orders(sell_orders, "sell orders")
+            self.report_orders(buy_orders, " buy orders")
+        books = self.collect_orders(buy_orders, sell_orders)
         for resource_type in Resource:
-            filtered_sells = [(ent, o) for ent, o in sell_orders if o.resource == resource_type]
-            filtered_buys = [(ent, o) for ent, o in buy_orders if o.resource == resource_type]
-            if len(filtered_buys) == 0 and len(filtered_sells) == 0:
-                continue
-            log.debug(f"Processing orders for {resource_type}")
-            self.report_orders(filtered_sells, "sell orders")
-            self.report_orders(filtered_buys, " buy orders")
-            eligible_sell, eligible_buy = self.eligible_orders(filtered_sells, filtered_buys)
-            while not order_pairs_are_valid(eligible_buy, eligible_sell):
-                eligible_buy, eligible_sell = fix_orders(eligible_buy, eligible_sell)
-
-            transactions = self.process_orders(eligible_buy, eligible_sell)
-            globals.stats_history.register_day_transactions(globals.star_date, resource_type, all_buy=filtered_buys,
-                                                            all_sell=filtered_sells, fulfilled_buy=eligible_buy,
-                                                            fulfilled_sell=eligible_sell, transactions=transactions)
+            if resource_type in books:
+                self.clear_market(resource_type, books[resource_type])
+
+    def collect_orders(self, buy_orders, sell_orders) -> Dict[Resource, OrderBook]:
+        return OrderBook.for_orders(buy_orders, sell_orders)
+
+    def clear_market(self, resource_type: Resource, book: OrderBook):
+        if debug_enabled():
+            log.debug("Processing orders for %s", resource_type)
+            self.report_orders(book.asks, "sell orders")
+            self.report_orders(book.bids, " buy orders")
+        star_date = star_date_for(self.world)
+        market = MarketStats(star_date, resource_type)
+        for _, order in book.bids:
+            market.add("buy_stats", order.price, order.amount)
+        for _, order in book.asks:
+            market.add("sell_stats", order.price, order.amount)
+        eligible_buy, eligible_sell = book.match_orders()
+        for order, units in eligible_buy:
+            market.add("fulfilled_buy", order.price, units)
+        for order, units in eligible_sell:
+            market.add("fulfilled_sell", order.price, units)
+
+        fills = pair_orders(eligible_buy, eligible_sell)
+        count(self, "orders", len(book.bids) + len(book.asks))
+        count(self, "fills", len(fills))
+        self.process_orders(fills, market)
+        stats_history_for(self.world).register_day(market.stats_for_day())
+        if events_enabled():
+            event("market", date=star_date.time, resource=resource_type.name, bids=len(book.bids),
+                  asks=len(book.asks), fills=len(fills), units=market.accumulators["transactions"].length)
 
     @icontract.require(lambda buy_order, sell_order: buy_order.price >= sell_order.price)
+    @icontract.require(lambda buy_order, sell_order, amount: 0 < amount <= min(buy_order.remaining(), sell_order.remaining()))
     @icontract.ensure(lambda result, buy_order, sell_order: abs(2*result.creds - (buy_order.price + sell_order.price).creds) <= 1)
-    @icontract.ensure(
-        lambda buy_order, sell_order: buy_order.status == OrderStatus.BOUGHT and sell_order.status == OrderStatus.SOLD)
-    def process_transaction(self, buy_order: BuyOrder, sell_order: SellOrder) -> Money:
+    @icontract.ensure(lambda buy_order: (buy_order.status == OrderStatus.BOUGHT) == (buy_order.remaining() == 0))
+    @icontract.ensure(lambda sell_order: (sell_order.status == OrderStatus.SOLD) == (sell_order.remaining() == 0))
+    def process_transaction(self, buy_order: BuyOrder, sell_order: SellOrder, amount: int = 1) -> Money:
+        # returns price of a single unit, all units in one transaction are traded for the same price
         if buy_order.price < sell_order.price:
             raise Exception(f"Attempted to buy at lower price then seller wanted")
-        transaction_price, _ = (buy_order.price + sell_order.price).split()
-        self.world.component_for_entity(sell_order.owner, Wallet).money += transaction_price
+        transaction_price, _ = (buy_order.price + sell_order.price).split(random_for(self.world))
+        ledger = ledger_for(self.world)
+        # money for the seller comes from what the buyer locked when creating order
+        ledger.release(self.world.component_for_entity(sell_order.owner, Wallet), transaction_price.multiply(amount))
         self.world.component_for_entity(sell_order.owner, Wallet).register_transaction(sell_order.resource,
                                                                                        transaction_price,
                                                                                        OrderStatus.SOLD)
         # buyer gets a refund from what he payed upfront when creating order
-        self.world.component_for_entity(buy_order.owner, Wallet).money += buy_order.price - transaction_price
+        ledger.release(self.world.component_for_entity(buy_order.owner, Wallet),
+                       (buy_order.price - transaction_price).multiply(amount))
         self.world.component_for_entity(buy_order.owner, Wallet).register_transaction(sell_order.resource,
                                                                                       transaction_price,
                                                                                       OrderStatus.BOUGHT)
-        self.world.component_for_entity(buy_order.owner, Storage).add_one_of(sell_order.resource)
-        # Orders are deleted in cleanup phase
-        sell_order.status = OrderStatus.SOLD
-        buy_order.status = OrderStatus.BOUGHT
+        self.world.component_for_entity(buy_order.owner, Storage).add(ResourcePile(sell_order.resource, amount))
+        # Orders are deleted in cleanup phase, partially filled ones are cancelled before
+        sell_order.fill(amount)
+        buy_order.fill(amount)
 
-        log.debug(f"{buy_order} and {sell_order} fulfilled for {transaction_price}. Buyer got a return of {buy_order.price - transaction_price}")
+        if sampled(buy_order.owner):
+            log.debug("%s of %s and %s fulfilled for %s each. Buyer got a return of %s for each", amount, buy_order,
+                      sell_order, transaction_price, buy_order.price - transaction_price)
 
         return transaction_price
 
-    def process_orders(self, buy_orders, sell_orders) -> List[Money]:
-        if len(sell_orders) < len(buy_orders):
-            self.report_orders(sell_orders, "chosen sell")
-            self.report_orders(buy_orders[len(buy_orders) - len(sell_orders):], " chosen buy")
-        else:
-            self.report_orders(sell_orders[:len(buy_orders)], "chosen sell")
-            self.report_orders(buy_orders, " chosen buy")
-
-        transactions = []
+    def process_orders(self, fills: List[Fill], market: MarketStats):
+        if debug_enabled():
+            self.report_orders([(None, fill.sell_order) for fill in fills], "chosen sell")
+            self.report_orders([(None, fill.buy_order) for fill in fills], " chosen buy")
 
-        for buy, sell in self.create_order_pairs(buy_orders, sell_orders):
-            _, buy_order = buy
-            _, sell_order = sell
-            transaction_price = self.process_transaction(buy_order, sell_order)
-            if transaction_price is not None:
-                transactions.append(transaction_price)
+        for fill in fills:
+            transaction_price = self.process_transaction(fill.buy_order, fill.sell_order, fill.amount)
+            market.add("transactions", transaction_price, fill.amount)
 
         print_total_money(self.world, "After orders where processed")
-        return transactions
 
     def report_orders(self, orders, name):
+        # sorting all orders is expensive, it is done only when the summary is going to be logged
+        if not debug_enabled():
+            return
         if len(orders) > 0:
-            mean = statistics.mean([order.price.creds for ent, order in orders])
-            prices = ", ".join([f"{p}" for p in sorted([order.price for ent, order in orders])])
-            log.debug(f"{name}: {prices} (mean: {mean:.2f})")
+            mean = sum(order.price.creds * order.amount for ent, order in orders) / sum(order.amount for ent, order in orders)
+            prices = ", ".join([f"{o.amount}x{o.price}" for o in sorted([order for ent, order in orders], key=lambda o: o.price.creds)])
+            log.debug("%s: %s (mean: %.2f)", name, prices, mean)
         else:
-            log.debug(f"{name}: None")
-
-    def eligible_orders(self, sell_orders, buy_orders):
-        if len(buy_orders) == 0 or len(sell_orders) == 0:
-            return [], []
-        max_buy = max(buy_orders, key=lambda x: x[1].price)[1].price
-        min_sell = min(sell_orders, key=lambda x: x[1].price)[1].price
-        return sorted(
-            [(ent, o) for ent, o in sell_orders if o.price <= max_buy],
-            key=lambda x: x[1].price), sorted(
-            [(ent, o) for ent, o in buy_orders if o.price >= min_sell],
-            key=lambda x: x[1].price)
+            log.debug("%s: None", name)
 
 
 class OrderCancellation(esper.Processor):
@@ -294,44 +343,53 @@ class OrderCancellation(esper.Processor):
     @icontract.require(lambda buy_order: buy_order.status == OrderStatus.UNPROCESSED)
     @icontract.ensure(lambda buy_order: buy_order.status == OrderStatus.CANCELLED)
     def cancel_buy_order(self, buy_order: BuyOrder):
-        owner_name = self.world.component_for_entity(buy_order.owner, Details).name
-        self.world.component_for_entity(buy_order.owner, Wallet).money += buy_order.price
+        ledger_for(self.world).release(self.world.component_for_entity(buy_order.owner, Wallet),
+                                       buy_order.price.multiply(buy_order.remaining()))
         buy_order.status = OrderStatus.CANCELLED
         self.world.component_for_entity(buy_order.owner, Wallet).register_order(buy_order)
-        #log.debug(f"{owner_name} gained {buy_order.price} back as the order for {buy_order.resource} was cancelled")
+        if sampled(buy_order.owner):
+            log.debug("%s gained %s back as the order for %s was cancelled",
+                      self.world.component_for_entity(buy_order.owner, Details).name,
+                      buy_order.price.multiply(buy_order.remaining()), buy_order.resource)
 
     @icontract.require(lambda sell_order: sell_order.status == OrderStatus.UNPROCESSED)
     @icontract.ensure(lambda sell_order: sell_order.status == OrderStatus.CANCELLED)
     def cancel_sell_order(self, sell_order: SellOrder):
-        owner_name = self.world.component_for_entity(sell_order.owner, Details).name
         owner_storage = self.world.component_for_entity(sell_order.owner, Storage)
-        owner_storage.add_one_of(sell_order.resource)
+        owner_storage.add(ResourcePile(sell_order.resource, sell_order.remaining()))
         sell_order.status = OrderStatus.CANCELLED
         self.world.component_for_entity(sell_order.owner, Wallet).register_order(sell_order)
-        #log.debug(f"{owner_name} gained {sell_order.resource} back as the order for {sell_order.price} was cancelled")
+        if sampled(sell_order.owner):
+            log.debug("%s gained %s back as the order for %s was cancelled",
+                      self.world.component_for_entity(sell_order.owner, Details).name,
+                      ResourcePile(sell_order.resource, sell_order.remaining()), sell_order.price)
 
-    @icontract.snapshot(lambda self: self)
-    @icontract.ensure(lambda OLD, self: total_money_locked_in_orders(self.world) + total_money_in_wallets(self.world) == total_money_locked_in_orders(OLD.self.world) + total_money_in_wallets(OLD.self.world))
+    @icontract.ensure(lambda self: ledger_for(self.world).is_balanced())
+    @icontract.ensure(lambda self: ledger_for(self.world).held == 0, "All locked money is returned after cancellation")
     def process(self):
         # self.world._clear_dead_entities()
         log.debug("\nOrder Cancellation Phase started.")
         print_total_money(self.world, "Before Cancellation")
         sell_orders = self.world.get_component(SellOrder)
         buy_orders = self.world.get_component(BuyOrder)
-        log.debug(f"Locks will be released for {len(sell_orders)} sell and {len(buy_orders)} buy orders still on market")
+        log.debug("Locks will be released for %s sell and %s buy orders still on market", len(sell_orders), len(buy_orders))
+        cancelled = 0
         for ent, buy_order in filter(lambda o: o[1].status == OrderStatus.UNPROCESSED, buy_orders):
             # we return money back as the order didn't happen
             self.cancel_buy_order(buy_order)
+            cancelled += 1
 
         for ent, sell_order in filter(lambda o: o[1].status == OrderStatus.UNPROCESSED, sell_orders):
             # we return resources back as the order didn't happen
             self.cancel_sell_order(sell_order)
+            cancelled += 1
+        count(self, "cancelled_orders", cancelled)
 
         # mark all orders for deletion
         for ent, order in self.world.get_component(SellOrder):
-            self.world.add_component(ent, Terminated())
+            add_later(self.world, ent, Terminated())
         for ent, order in self.world.get_component(BuyOrder):
-            self.world.add_component(ent, Terminated())
+            add_later(self.world, ent, Terminated())
 
         print_total_money(self.world, "After Cancellation")
 
@@ -340,14 +398,21 @@ class Maturity(esper.Processor):
         super().__init__()
 
     def process(self):
+        clones = 0
         for ent, (details, storage) in self.world.get_components(Details, Storage):
             if storage.has_one(Resource.GROWN_HUMAN):
-                log.warning(f"{details.name} created a grown human!")
-                storage.remove_one_of(ResourcePile(Resource.GROWN_HUMAN))
-                # FIXME cloning center should also have bought this water
-                # FIXME those values should be constant and same as for other people in the world
-                create_person(self.world, f"Clone-{randint(0,10000)}", food_consumption=0.5, food_amount=5, water_amount=5, water_consumption=0.25, money=0)
+                grow_clone(self.world, details, storage)
+                clones += 1
+        count(self, "clones", clones)
+
 
+def grow_clone(world, details: Details, storage: Storage):
+    log.warning("%s created a grown human!", details.name)
+    storage.remove_one_of(ResourcePile(Resource.GROWN_HUMAN))
+    # FIXME cloning center should also have bought this water
+    # FIXME those values should be constant and same as for other people in the world
+    create_person(world, f"Clone-{random_for(world).randint(0,10000)}", food_consumption=0.5, food_amount=5, water_amount=5, water_consumption=0.25, money=0)
+    event("clone", date=star_date_for(world).time, center=details.name)
 
 
 class Death(esper.Processor):
@@ -356,13 +421,22 @@ class Death(esper.Processor):
 
     def process(self):
         for _, (pool_storage, pool_wallet, _) in self.world.get_components(Storage, Wallet, InheritancePool):
-            for ent, (details, storage, wallet, _) in self.world.get_components(Details, Storage, Wallet, Hunger):
-                log.warning(f"{details.name} died of hunger")
-                storage.add_one_of(Resource.SOUL)
-                pool_storage.add_all(storage)
-                pool_wallet.money += wallet.money
-                self.world.add_component(ent, Terminated())
-            log.debug(f"Inheritance pool contents: {pool_wallet.money} and {pool_storage}")
+            hungry = self.world.get_components(Details, Storage, Wallet, Hunger)
+            for ent, (details, storage, wallet, _) in hungry:
+                die_of_hunger(self.world, details, storage, wallet, pool_storage, pool_wallet)
+                add_later(self.world, ent, Terminated())
+            count(self, "deaths", len(hungry))
+            log.debug("Inheritance pool contents: %s and %s", pool_wallet.money, pool_storage)
+
+
+def die_of_hunger(world, details: Details, storage: Storage, wallet: Wallet, pool_storage: Storage, pool_wallet: Wallet):
+    # everything of the dead goes to the inheritance pool, marking them Terminated is left to the caller
+    log.warning("%s died of hunger", details.name)
+    event("death", date=star_date_for(world).time, name=details.name, money=wallet.money.creds)
+    storage.add_one_of(Resource.SOUL)
+    pool_storage.add_all(storage)
+    ledger_for(world).transfer(wallet, pool_wallet, wallet.money)
+
 
 class InheritanceLottery(esper.Processor):
     def __init__(self):
@@ -371,25 +445,33 @@ class InheritanceLottery(esper.Processor):
     def process(self):
         for _, (pool_storage, pool_wallet, _) in self.world.get_components(Storage, Wallet, InheritancePool):
             if pool_wallet.money.creds > 0:
-                winner, (details, storage, wallet) = choice(self.world.get_components(Details, Storage, Wallet))
-                half, _ = pool_wallet.money.split()
-                if not self.world.has_component(winner, Terminated):
-                    log.debug(f"{details.name} won {half} at the inheritance lottery!")
-                    wallet.money += half
-                    pool_wallet.money -= half
-                else:
-                    log.debug(f"{details.name} won {half} at the inheritance lottery but was already dead!")
-                log.debug(f"Inheritance pool contents: {pool_wallet.money} and {pool_storage}")
+                draw_lottery(self.world, pool_wallet, lambda ent: self.world.has_component(ent, Terminated))
+                log.debug("Inheritance pool contents: %s and %s", pool_wallet.money, pool_storage)
+
+
+def draw_lottery(world, pool_wallet: Wallet, is_dead: Callable[[int], bool]):
+    # half of the pool goes to a random winner, unless the winner is dead
+    rng = random_for(world)
+    winner, (details, storage, wallet) = rng.choice(world.get_components(Details, Storage, Wallet))
+    half, _ = pool_wallet.money.split(rng)
+    if not is_dead(winner):
+        log.debug("%s won %s at the inheritance lottery!", details.name, half)
+        event("lottery", date=star_date_for(world).time, winner=details.name, prize=half.creds)
+        ledger_for(world).transfer(pool_wallet, wallet, half)
+    else:
+        log.debug("%s won %s at the inheritance lottery but was already dead!", details.name, half)
+
 
 class WealthRedistribution(esper.Processor):
     def __init__(self, tax_rate: float = 0):
         super().__init__()
         self.tax_rate = tax_rate
 
-    @icontract.snapshot(lambda self: self)
-    @icontract.ensure(lambda OLD, self: total_money_in_wallets(self.world) == total_money_in_wallets(OLD.self.world))
+    @icontract.snapshot(lambda self: ledger_for(self.world).in_wallets, name="in_wallets")
+    @icontract.ensure(lambda OLD, self: ledger_for(self.world).in_wallets == OLD.in_wallets,
+                      "Redistributing money should not change the amount of it")
     def process(self):
-        money_before_redistribution = total_money_in_wallets(self.world)
+        ledger = ledger_for(self.world)
         money_for_redistribution = Money(0)
         total_wallets = len(self.world.get_component(Wallet))
         last_wallet = None
@@ -397,18 +479,17 @@ class WealthRedistribution(esper.Processor):
             if not self.world.has_component(ent, Terminated):
                 tax = wallet.money.multiply(self.tax_rate)
                 money_for_redistribution += tax
-                wallet.money -= tax
+                ledger.hold(wallet, tax)
         ubi_value = money_for_redistribution.multiply(1/total_wallets)
         for ent, wallet in self.world.get_component(Wallet):
             if not self.world.has_component(ent, Terminated):
                 money_for_redistribution -= ubi_value
-                wallet.money += ubi_value
+                ledger.release(wallet, ubi_value)
                 last_wallet = wallet
         # last one gets whats left
         if last_wallet is not None:
-            last_wallet.money += money_for_redistribution
-        log.info(f"Ubi this round is: {ubi_value}")
-        assert money_before_redistribution == total_money_in_wallets(self.world), f"Redistributing money should not change the amount of it: {money_before_redistribution} changed to {total_money_in_wallets(self.world)}"
+            ledger.release(last_wallet, money_for_redistribution)
+        log.info("Ubi this round is: %s", ubi_value)
 
 
 
@@ -421,47 +502,69 @@ class StatisticsUpdate(esper.Processor):
 
 
 def print_total_money(world, where):
-    total_money = total_money_in_wallets(world)
-    log.debug(f"Total money: {total_money}. ({where})")
-
-
-def total_money_in_wallets(world) -> Money:
-    wallets = world.get_component(Wallet)
-    return Money(sum([w.money.creds for ent, w in wallets]))
-
-
-def total_money_locked_in_orders(world) -> Money:
-    buy_orders = world.get_component(BuyOrder)
-    return Money(sum([o.price.creds for ent, o in buy_orders]))
+    if debug_enabled():
+        ledger = ledger_for(world)
+        log.debug("Total money: %scr, %scr held. (%s)", ledger.in_wallets, ledger.held, where)
 
 
 class TurnSummaryProcessor(esper.Processor):
-    def __init__(self):
+    def __init__(self, ticker_path: Optional[str] = "ticker.csv", ticker_format: str = "csv"):
+        # ticker_path: where to save prices of every day, None turns the ticker off
         super().__init__()
-        self.ticker = Ticker()
+        self.ticker = Ticker(ticker_path, ticker_format) if ticker_path is not None else None
 
     def process(self):
         print_total_money(self.world, "Turn end")
-        log.info(f"Prices in {globals.star_date}:")
+        star_date = star_date_for(self.world)
+        stats_history = stats_history_for(self.world)
+        log.info("Prices in %s:", star_date)
         for resource in Resource:
-            if globals.stats_history.has_stats_for_day(globals.star_date, resource):
-                log.info(globals.stats_history.stats_for_day(globals.star_date, resource))
-            self.ticker.log_transactions(resource)
+            if stats_history.has_stats_for_day(star_date, resource):
+                log.info(stats_history.stats_for_day(star_date, resource))
+            if self.ticker is not None:
+                self.ticker.log_transactions(stats_history, star_date, resource)
 
+        if info_enabled():
+            self.report_richest()
+
+    def close(self):
+        # writes the rest of the ticker and stops its thread, the world should not be processed afterwards
+        if self.ticker is not None:
+            self.ticker.close()
+
+    def report_richest(self):
         log.info("Richest entities:")
+        ledger = ledger_for(self.world)
         money_in_rich_pockets = Money(0)
-        for ent, (details, storage, wallets) in sorted(self.world.get_components(Details, Storage, Wallet),
-                                                       key=lambda x: -x[1][2].money.creds)[0:5]:
-            log.info(f"{details.name} has {wallets.money} left. Storage: {storage}")
-            money_in_rich_pockets += wallets.money
-        log.info(f"Richest have {money_in_rich_pockets} accounting for {money_in_rich_pockets.creds/total_money_in_wallets(self.world).creds*100:.2f}% of total money")
+        for ent, creds in ledger.wealth.richest(5):
+            details, storage = self.world.component_for_entity(ent, Details), self.world.component_for_entity(ent, Storage)
+            log.info("%s has %s left. Storage: %s", details.name, Money(creds), storage)
+            money_in_rich_pockets += Money(creds)
+        log.info("Richest have %s accounting for %.2f%% of total money (gini %.3f)", money_in_rich_pockets,
+                 money_in_rich_pockets.creds/ledger.in_wallets*100, ledger.wealth.gini())
+
+class Flush(esper.Processor):
+    # applies changes queued by earlier processors
+    def process(self):
+        if isinstance(self.world, CachedWorld):
+            self.world.flush()
+
 
 class Cleanup(esper.Processor):
     def __init__(self):
         super().__init__()
 
     def process(self):
-        for ent, terminated in self.world.get_component(Terminated):
-            self.world.delete_entity(ent)
+        ledger, order_pool = ledger_for(self.world), order_pool_for(self.world)
+        for ent, (wallet, _) in self.world.get_components(Wallet, Terminated):
+            ledger.close(wallet)
+        # orders are deleted below like everything else and kept in the pool for new orders
+        for order_type in (BuyOrder, SellOrder):
+            for ent, (order, _) in self.world.get_components(order_type, Terminated):
+                order_pool.release(ent, order)
+        terminated = self.world.get_component(Terminated)
+        for ent, _ in terminated:
+            delete_later(self.world, ent)
+        count(self, "deleted_entities", len(terminated))
 
 
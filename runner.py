@@ -0,0 +1,71 @@
+import time
+from typing import Optional
+
+import checkpoint
+from instrumentation import InstrumentedWorld
+from log import log
+from processors import TurnSummaryProcessor
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is not reported there
+    resource = None
+
+
+class BatchReport:
+    def __init__(self, ticks: int, elapsed: float, phase_times, peak_memory: Optional[int]):
+        self.ticks = ticks
+        self.elapsed = elapsed
+        self.phase_times = phase_times
+        self.peak_memory = peak_memory
+
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        lines = [f"Ran {self.ticks} ticks in {self.elapsed:.2f}s ({self.ticks_per_second():.2f} ticks/s)"]
+        total = sum(self.phase_times.values())
+        for phase, spent in sorted(self.phase_times.items(), key=lambda p: -p[1]):
+            share = spent / total * 100 if total > 0 else 0.0
+            lines.append(f"  {phase:<24} {spent:>9.3f}s {share:>6.2f}%")
+        if self.peak_memory is not None:
+            lines.append(f"Peak memory: {self.peak_memory / 2**20:.1f} MB")
+        return "\n".join(lines)
+
+
+def peak_memory() -> Optional[int]:
+    if resource is None:
+        return None
+    # linux reports kilobytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_batch(world: InstrumentedWorld, ticks: Optional[int] = None, budget: Optional[float] = None,
+              checkpoint_every: Optional[int] = None, checkpoint_path: str = "checkpoint.bin") -> BatchReport:
+    # Runs until given number of ticks is processed or time budget (in seconds) runs out, whatever comes first.
+    # Without any of them it runs until interrupted. With checkpoint_every the world is saved every this many ticks.
+    # The world is closed afterwards, its ticker is written out.
+    done = 0
+    start = time.perf_counter()
+    try:
+        while ticks is None or done < ticks:
+            world.process()
+            done += 1
+            if checkpoint_every is not None and done % checkpoint_every == 0:
+                checkpoint.save(world, checkpoint_path)
+                log.info("Saved checkpoint to %s", checkpoint_path)
+            if budget is not None and time.perf_counter() - start >= budget:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close(world)
+    return BatchReport(done, time.perf_counter() - start, dict(world.instrumentation.wall_time_totals), peak_memory())
+
+
+def close(world):
+    # lets go of files and threads of processors once a world is not going to be processed any more
+    turn_summary = world.get_processor(TurnSummaryProcessor)
+    if turn_summary is not None:
+        turn_summary.close()
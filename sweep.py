@@ -0,0 +1,120 @@
+import argparse
+import csv
+import itertools
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from typing import Dict, List
+
+from components import Terminated, Resource, Consumer, RandomStream
+from globals import star_date_for, stats_history_for
+from ledger import ledger_for
+from log import log
+from main import init, createManyEntities, MANY_ENTITIES_AGENTS
+from runner import run_batch
+
+# parameters of a run which are not passed to createManyEntities
+RUN_PARAMETERS = ["tax_rate", "agents", "ticks", "seed"]
+
+
+def available_cores() -> int:
+    # cores this process may run on, which can be less than all cores of the machine
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def parameter_grid(parameters: Dict[str, List]) -> List[Dict]:
+    # every combination of parameter values
+    names = list(parameters.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[parameters[name] for name in names])]
+
+
+def median_price(world, resource: Resource, days: int):
+    # median of daily median transaction prices over last days, None if nothing was traded
+    today = star_date_for(world).time
+    medians = [stats.transactions.median.creds for stats in
+               stats_history_for(world).stats_between(today - days + 1, today, resource)
+               if stats.transactions.median is not None]
+    return statistics.median_low(medians) if len(medians) > 0 else None
+
+
+def summarize(world, price_days: int = 10) -> Dict:
+    wealth = ledger_for(world).wealth
+    totals = world.instrumentation.counter_totals
+    people = [ent for ent, consumer in world.get_component(Consumer) if not world.has_component(ent, Terminated)]
+    summary = {
+        "gini": wealth.gini(),
+        "top_10_share": wealth.top_share(0.1),
+        # the fused Lifecycle processor counts both
+        "deaths": totals["Death"]["deaths"] + totals["Lifecycle"]["deaths"],
+        "clones": totals["Maturity"]["clones"] + totals["Lifecycle"]["clones"],
+        "people": len(people),
+    }
+    for resource in Resource:
+        if resource != Resource.NOTHING:
+            summary[f"median_{resource.name.lower()}"] = median_price(world, resource, price_days)
+    return summary
+
+
+def run(settings: Dict, log_level: str = "ERROR") -> Dict:
+    # one independent world, called in worker processes
+    log.setLevel(log_level)
+    scenario_parameters = {name: value for name, value in settings.items() if name not in RUN_PARAMETERS}
+    scenario = partial(createManyEntities, scale=settings["agents"] / MANY_ENTITIES_AGENTS, **scenario_parameters)
+    world = init(scenario, ticker_path=None, tax_rate=settings["tax_rate"], seed=settings["seed"])
+    report = run_batch(world, settings["ticks"])
+    return {**settings, "seconds": report.elapsed, **summarize(world)}
+
+
+def sweep(parameters: Dict[str, List], agents: int, ticks: int, repeats: int = 1, seed: int = 0, workers=None,
+          log_level: str = "ERROR"):
+    # yields results of runs as they finish, every repeat runs with a seed derived from the given one, the seed saved
+    # with the results reproduces the run with main.py --seed
+    streams = RandomStream(seed)
+    runs = [{**settings, "agents": agents, "ticks": ticks, "seed": streams.substream(repeat).initial_seed}
+            for settings in parameter_grid(parameters) for repeat in range(repeats)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run, settings, log_level) for settings in runs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description="Runs the 'many' scenario for every combination of given parameters "
+                                                 "in parallel and saves a summary of every run.")
+    parser.add_argument("--tax-rate", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--food-consumption", type=float, nargs="+", default=[0.5])
+    parser.add_argument("--water-consumption", type=float, nargs="+", default=[0.25])
+    parser.add_argument("--food-production", type=int, nargs="+", default=[2])
+    parser.add_argument("--water-production", type=int, nargs="+", default=[2])
+    parser.add_argument("--agents", type=int, default=MANY_ENTITIES_AGENTS, help="agents in every world")
+    parser.add_argument("--ticks", type=int, default=500, help="ticks to run every world for")
+    parser.add_argument("--repeats", type=int, default=1, help="runs with different seeds for every combination")
+    parser.add_argument("--seed", type=int, default=0, help="seed from which seeds of all runs are derived")
+    parser.add_argument("--workers", type=int, default=available_cores(), help="processes to run worlds in")
+    parser.add_argument("--log-level", default="ERROR", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--output", default="sweep.csv", help="where to save results")
+    return parser.parse_args(arguments)
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    parameters = {
+        "tax_rate": arguments.tax_rate,
+        "food_consumption": arguments.food_consumption,
+        "water_consumption": arguments.water_consumption,
+        "food_production": arguments.food_production,
+        "water_production": arguments.water_production,
+    }
+    with open(arguments.output, mode="w", newline="") as output:
+        writer = None
+        for result in sweep(parameters, arguments.agents, arguments.ticks, arguments.repeats, arguments.seed,
+                            arguments.workers, arguments.log_level):
+            if writer is None:
+                writer = csv.DictWriter(output, fieldnames=list(result.keys()))
+                writer.writeheader()
+            writer.writerow(result)
+            output.flush()
+            print(", ".join(f"{name}={value}" for name, value in result.items()))
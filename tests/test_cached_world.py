@@ -0,0 +1,113 @@
+import esper
+from hypothesis import given, strategies as st
+
+from cached_world import CachedWorld
+
+
+class A:
+    pass
+
+
+class B:
+    pass
+
+
+class C:
+    pass
+
+
+def test_views_are_kept_until_a_component_of_their_types_changes():
+    world = CachedWorld()
+    first = world.create_entity(A(), B())
+    world.create_entity(A())
+    both, only_a = world.get_components(A, B), world.get_component(A)
+    assert world.get_components(A, B) is both and world.get_component(A) is only_a
+
+    world.add_component(first, C())
+    assert world.get_components(A, B) is both and world.get_component(A) is only_a
+    world.add_component(first, B())
+    assert world.get_components(A, B) is not both and world.get_component(A) is only_a
+    world.delete_entity(first)
+    world._clear_dead_entities()
+    assert world.get_component(A) is not only_a and len(world.get_component(A)) == 1
+
+
+# (operation, entity, component type): 0 adds, 1 removes a component, 2 deletes the entity, 3 and 4 queue an add and
+# a delete and 5 flushes the queue
+operations = st.lists(st.tuples(st.integers(0, 5), st.integers(0, 4), st.sampled_from([A, B, C])), max_size=40)
+
+
+def flush_plain(world: esper.World, queued):
+    # what flush does, with plain esper calls: adds, then deletes of what is still there
+    for operation, entity, component_type in sorted(queued, key=lambda change: change[0]):
+        if operation == 3:
+            world.add_component(entity, component_type())
+        elif operation == 4 and entity in world._entities:
+            world.delete_entity(entity, immediate=True)
+    queued.clear()
+
+
+@given(operations)
+def test_queries_give_the_same_as_esper(operations):
+    cached, plain = CachedWorld(), esper.World()
+    queued = []
+    for world in (cached, plain):
+        for _ in range(5):
+            world.create_entity()
+    for operation, entity, component_type in operations:
+        entity += 1
+        for world in (cached, plain):
+            if operation == 0:
+                world.add_component(entity, component_type())
+            elif operation == 1 and entity in world._entities and world.has_component(entity, component_type):
+                world.remove_component(entity, component_type)
+            elif operation == 2 and entity in world._entities:
+                world.delete_entity(entity, immediate=True)
+        if operation == 3:
+            cached.add_later(entity, component_type())
+        elif operation == 4:
+            cached.delete_later(entity)
+        if operation in (3, 4):
+            queued.append((operation, entity, component_type))
+        elif operation == 5:
+            cached.flush()
+            flush_plain(plain, queued)
+        for query in [(A,), (B,), (A, B), (A, B, C)]:
+            assert sorted(e for e, _ in cached.get_components(*query)) == sorted(e for e, _ in plain.get_components(*query))
+        # replaced components are not served from old views
+        assert all(cached.component_for_entity(e, C) is c for e, c in cached.get_component(C))
+    cached._clear_dead_entities()
+    flush_plain(plain, queued)
+    assert cached._entities.keys() == plain._entities.keys()
+
+
+def test_entities_deleted_twice_are_deleted_once():
+    world = CachedWorld()
+    first, second = world.create_entity(A()), world.create_entity(A())
+    world.delete_later(first)
+    world.delete_later(first)
+    world.delete_later(second)
+    world.delete_entity(second)
+    world.process()
+    assert world.get_component(A) == [] and world._entities == {}
+
+
+def test_queued_changes_are_applied_together_on_flush():
+    world = CachedWorld()
+    kept, deleted = world.create_entity(A(), B()), world.create_entity(A())
+    only_a = world.get_component(A)
+    world.add_later(kept, C())
+    world.delete_later(deleted)
+    assert world.get_component(A) is only_a and world.get_component(C) == []
+
+    world.flush()
+    assert [e for e, _ in world.get_component(A)] == [kept]
+    assert [e for e, _ in world.get_component(C)] == [kept]
+
+
+def test_queued_changes_are_applied_before_next_tick():
+    world = CachedWorld()
+    entity = world.create_entity(A())
+    world.add_later(entity, B())
+    world.process()
+    assert world.has_component(entity, B)
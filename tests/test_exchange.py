@@ -3,8 +3,8 @@ import esper
 from hypothesis import given
 import hypothesis.strategies as st
 
-from components import Money, Wallet, Storage, ResourcePile, Resource, SellOrder, BuyOrder, OrderStatus
-from processors import Exchange
+from components import Money, Wallet, Storage, ResourcePile, Resource, SellOrder, BuyOrder, OrderStatus, Details
+from processors import Exchange, OrderCancellation
 
 
 def prepare_transaction_arguments(world, buyer_money, seller_money, buy_price, sell_price):
@@ -52,4 +52,28 @@ def test_process_transaction(buyer_money, seller_money, buy_price, sell_price):
     assert world.component_for_entity(buyer, Wallet).last_transaction_details_for(Resource.FOOD) == (transaction_price, OrderStatus.BOUGHT), "Buyer did not register his transaction correctly"
     # buyer did not have anything before exchange
     assert world.component_for_entity(buyer, Storage).amount(Resource.FOOD) == 1, "Buyer did not get what he bought"
-    assert buy_order.status == OrderStatus.BOUGHT
\ No newline at end of file
+    assert buy_order.status == OrderStatus.BOUGHT
+
+def test_partially_filled_orders_are_refunded_on_cancellation():
+    world = esper.World()
+    exchange = Exchange()
+    cancellation = OrderCancellation()
+    exchange.world = world
+    cancellation.world = world
+    buyer, buy_order, seller, sell_order = prepare_transaction_arguments(world, 0, 0, 10, 10)
+    world.add_component(buyer, Details("buyer"))
+    world.add_component(seller, Details("seller"))
+    buy_order.amount = 3
+    sell_order.amount = 2
+
+    transaction_price = exchange.process_transaction(buy_order, sell_order, 2)
+    assert transaction_price.creds == 10
+    assert sell_order.status == OrderStatus.SOLD
+    assert buy_order.status == OrderStatus.UNPROCESSED
+    assert world.component_for_entity(seller, Wallet).money.creds == 20
+    assert world.component_for_entity(buyer, Storage).amount(Resource.FOOD) == 2
+
+    cancellation.cancel_buy_order(buy_order)
+    # buyer locked 30cr for three units, the one which was not bought is returned
+    assert world.component_for_entity(buyer, Wallet).money.creds == 10
+    assert world.component_for_entity(buyer, Wallet).last_transaction_details_for(Resource.FOOD) == (Money(10), OrderStatus.CANCELLED)
@@ -0,0 +1,39 @@
+import csv
+
+import esper
+
+from components import Storage, Terminated
+from instrumentation import InstrumentedWorld
+from processors import Cleanup
+
+
+def test_processors_are_timed_and_counted_for_recent_ticks_only(tmp_path):
+    world = InstrumentedWorld(capacity=2)
+    world.add_processor(Cleanup())
+    for tick in range(3):
+        world.create_entity(Terminated())
+        world.create_entity(Terminated())
+        world.process()
+
+    samples = world.instrumentation.last(5)
+    assert [sample.tick for sample in samples] == [2, 3]
+    assert samples[-1].processors["Cleanup"].calls == 1
+    assert samples[-1].processors["Cleanup"].counters["deleted_entities"] == 2
+    assert world.instrumentation.counter_totals["Cleanup"]["deleted_entities"] == 6
+
+    path = tmp_path / "processors.csv"
+    world.instrumentation.to_csv(str(path))
+    with open(path) as saved:
+        rows = list(csv.DictReader(saved))
+    assert {(row["tick"], row["metric"]) for row in rows} == {(tick, metric) for tick in ["2", "3"]
+                                                              for metric in ["wall_time", "calls", "deleted_entities"]}
+
+
+def test_counting_in_plain_world_does_nothing():
+    world = esper.World()
+    world.add_processor(Cleanup())
+    kept, deleted = world.create_entity(Storage()), world.create_entity(Terminated())
+    world.process()
+    world.process()
+    assert kept in world._entities and deleted not in world._entities
+    assert not hasattr(world, "instrumentation")
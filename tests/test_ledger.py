@@ -0,0 +1,101 @@
+import esper
+import pytest
+
+from components import Money, Wallet, BuyOrder, Resource
+from entities import open_wallet
+from ledger import Ledger, WealthIndex, ledger_for, sorted_gini
+
+
+def test_ledger_keeps_money_balanced_when_it_moves_between_wallets_and_orders():
+    world = esper.World()
+    world.create_entity(Ledger())
+    buyer = open_wallet(world, 100)
+    seller = open_wallet(world, 50)
+    world.create_entity(buyer)
+    world.create_entity(seller)
+    ledger = ledger_for(world)
+
+    ledger.hold(buyer, Money(30))
+    world.create_entity(BuyOrder(1, Resource.FOOD, Money(30)))
+    ledger.audit(world)
+    ledger.release(seller, Money(30))
+    ledger.transfer(seller, buyer, Money(5))
+
+    assert (buyer.money.creds, seller.money.creds) == (75, 75)
+    assert (ledger.in_wallets, ledger.held, ledger.issued) == (150, 0, 150)
+    assert ledger.is_balanced()
+
+
+def test_audit_finds_money_which_did_not_go_through_the_ledger():
+    world = esper.World()
+    world.create_entity(Wallet(Money(10)))
+    ledger = ledger_for(world)
+    ledger.audit(world)
+
+    world.create_entity(Wallet(Money(10)))
+    with pytest.raises(Exception):
+        ledger.audit(world)
+
+
+def test_wealth_index_follows_wallets_changed_through_the_ledger():
+    world = esper.World()
+    ledger = Ledger()
+    world.create_entity(ledger)
+    wallets = [open_wallet(world, 10 * i, owner=i) for i in range(1, 11)]
+    pool = open_wallet(world, 0)
+
+    ledger.transfer(wallets[9], wallets[0], Money(95))
+    assert ledger.wealth.richest(2) == [(1, 105), (9, 90)]
+    ledger.hold(wallets[8], Money(40))
+    ledger.transfer(wallets[7], pool, Money(80))
+    ledger.close(wallets[7])
+
+    money = sorted(w.money.creds for w in wallets if w is not wallets[7])
+    assert len(ledger.wealth) == 9 and ledger.wealth.total == sum(money)
+    assert ledger.wealth.percentile(0.5) == money[4]
+    assert ledger.wealth.gini() == pytest.approx(sorted_gini(money, sum(money)))
+    assert ledger.wealth.top_share(0.2) == pytest.approx((money[-1] + money[-2]) / sum(money))
+
+
+def test_wealth_concentration():
+    assert sorted_gini([5, 5, 5, 5], 20) == pytest.approx(0)
+    assert sorted_gini([0, 0, 0, 20], 20) == pytest.approx(0.75)
+    wealth = WealthIndex()
+    for owner, creds in enumerate([1] * 9 + [91]):
+        wealth.add(owner, creds)
+    assert wealth.top_share(0.1) == pytest.approx(0.91)
+
+
+def test_wealth_index_stays_in_order_when_most_wallets_change():
+    wealth = WealthIndex()
+    for owner in range(100):
+        wealth.add(owner, owner * 7 % 101)
+    wealth.refresh()
+    # flat tax and UBI for everyone, a new wallet and a few which jump places
+    for owner in range(100):
+        wealth.add(owner, (owner * 7 % 101) * 9 // 10 + 5)
+    wealth.add(100, 50)
+    wealth.add(3, 1000)
+    wealth.add(4, 0)
+    assert list(wealth.order) == sorted((creds, owner) for owner, creds in wealth.creds.items())
+    assert len(wealth) == 101 and wealth.total == sum(wealth.creds.values())
+
+
+def test_redistribute_gives_the_same_money_as_holding_taxes_and_releasing_shares():
+    creds = [0, 7, 120, 3333, 50001]
+    held, redistributed = Ledger(sum(creds)), Ledger(sum(creds))
+    by_hold = [Wallet(Money(c), owner=i) for i, c in enumerate(creds)]
+    by_redistribute = [Wallet(Money(c), owner=i) for i, c in enumerate(creds)]
+    taxes = [wallet.money.multiply(0.1) for wallet in by_hold]
+    for wallet, tax in zip(by_hold, taxes):
+        held.hold(wallet, tax)
+    collected = Money(sum(tax.creds for tax in taxes))
+    ubi = collected.multiply(1 / 7)
+    for wallet in by_hold:
+        held.release(wallet, ubi)
+    held.release(by_hold[-1], Money(collected.creds - ubi.creds * len(by_hold)))
+
+    assert redistributed.redistribute(by_redistribute, 0.1, 7) == ubi
+    assert [w.money for w in by_redistribute] == [w.money for w in by_hold]
+    assert redistributed.is_balanced() and redistributed.in_wallets == held.in_wallets
+    assert redistributed.wealth.gini() == held.wealth.gini()
@@ -0,0 +1,27 @@
+from functools import partial
+
+from globals import stats_history_for
+from ledger import ledger_for
+from main import init, createManyEntities, MANY_ENTITIES_AGENTS
+
+
+def run(fused_lifecycle: bool, ticks: int = 20):
+    world = init(partial(createManyEntities, scale=200 / MANY_ENTITIES_AGENTS), ticker_path=None, seed=3,
+                 fused_lifecycle=fused_lifecycle)
+    for _ in range(ticks):
+        world.process()
+    return world
+
+
+def test_fused_lifecycle_is_the_same_as_separate_processors():
+    separate, fused = run(False), run(True)
+    totals = separate.instrumentation.counter_totals
+    fused_totals = fused.instrumentation.counter_totals["Lifecycle"]
+    assert totals["Death"]["deaths"] > 0
+    assert (totals["Death"]["deaths"], totals["Maturity"]["clones"]) == (fused_totals["deaths"], fused_totals["clones"])
+    assert [str(stats) for stats in stats_history_for(fused).stats_between(0, 20)] == \
+           [str(stats) for stats in stats_history_for(separate).stats_between(0, 20)]
+    ledger = ledger_for(fused)
+    assert ledger.is_balanced()
+    assert ledger.in_wallets == ledger_for(separate).in_wallets
+    assert ledger.wealth.gini() == ledger_for(separate).wealth.gini()
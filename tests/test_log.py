@@ -0,0 +1,33 @@
+import json
+import logging
+
+import log
+from log import sampled, set_sample_every, event, enable_events
+
+
+def test_only_sampled_agents_are_logged_at_debug_level():
+    level = log.log.level
+    try:
+        log.log.setLevel(logging.DEBUG)
+        set_sample_every(3)
+        assert [ent for ent in range(7) if sampled(ent)] == [0, 3, 6]
+        log.log.setLevel(logging.INFO)
+        assert not any(sampled(ent) for ent in range(7))
+    finally:
+        set_sample_every(1)
+        log.log.setLevel(level)
+
+
+def test_events_are_written_as_json_lines_once_enabled(tmp_path):
+    event("death", name="Jacek")
+    path = tmp_path / "events.jsonl"
+    enable_events(str(path))
+    try:
+        event("death", name="Wacek", money=10)
+    finally:
+        for handler in list(log.events.handlers):
+            handler.close()
+            log.events.removeHandler(handler)
+        log.events.setLevel(logging.CRITICAL + 1)
+    with open(path) as saved:
+        assert [json.loads(line) for line in saved] == [{"event": "death", "name": "Wacek", "money": 10}]
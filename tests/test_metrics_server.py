@@ -0,0 +1,32 @@
+import json
+import urllib.request
+
+from main import init, createFewEntities
+from metrics_server import MetricsServer
+
+
+def test_every_tick_is_streamed_and_last_one_is_served():
+    server = MetricsServer().start()
+    try:
+        world = init(createFewEntities, ticker_path=None, seed=1, metrics_server=server)
+        client = server.subscribe()
+        for _ in range(3):
+            world.process()
+        streamed = [client.get_nowait() for _ in range(3)]
+        assert [metrics["time"] for metrics in streamed] == [1, 2, 3]
+        assert {"money", "population", "deaths", "prices"} <= streamed[0].keys()
+        assert "Exchange" in streamed[-1]["processors"]
+
+        with urllib.request.urlopen(f"{server.address()}/metrics") as response:
+            assert json.load(response)["time"] == 3
+    finally:
+        server.close()
+
+
+def test_slow_clients_lose_oldest_ticks_instead_of_stopping_publishing():
+    server = MetricsServer(client_queue=2)
+    client = server.subscribe()
+    for time in range(5):
+        server.publish({"time": time})
+    assert [client.get_nowait()["time"] for _ in range(2)] == [3, 4]
+    server.server.server_close()
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+from random import Random
+
+from hypothesis import given, strategies as st
+
+import components
+from components import CheckedMoney, FastMoney
+
+creds = st.integers(min_value=0, max_value=10 ** 12)
+
+
+@given(creds, creds, st.floats(min_value=0, max_value=2), st.integers())
+def test_fast_money_gives_the_same_as_checked_money(first, second, multiplier, seed):
+    high, low = max(first, second), min(first, second)
+    for fast, checked in [(FastMoney(high) + FastMoney(low), CheckedMoney(high) + CheckedMoney(low)),
+                          (FastMoney(high) - FastMoney(low), CheckedMoney(high) - CheckedMoney(low)),
+                          (FastMoney(high).remove(FastMoney(low)), CheckedMoney(high).remove(CheckedMoney(low))),
+                          (FastMoney(high).multiply(multiplier), CheckedMoney(high).multiply(multiplier))]:
+        assert type(fast) is FastMoney and type(checked) is CheckedMoney
+        assert fast.creds == checked.creds
+    fast_split, checked_split = FastMoney(high).split(Random(seed)), CheckedMoney(high).split(Random(seed))
+    assert [m.creds for m in fast_split] == [m.creds for m in checked_split]
+    assert (FastMoney(low) < FastMoney(high)) == (CheckedMoney(low) < CheckedMoney(high))
+
+
+def import_components(implementation: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-c", "from components import Money; print(Money.__name__)"],
+                          cwd=os.path.dirname(components.__file__), capture_output=True, text=True,
+                          env={**os.environ, "SPACEBUSINESS_MONEY": implementation})
+
+
+def test_money_implementation_is_chosen_by_environment():
+    assert import_components("fast").stdout.strip() == "FastMoney"
+    assert import_components("checked").stdout.strip() == "CheckedMoney"
+    unknown = import_components("gold")
+    assert unknown.returncode != 0 and "ValueError: Unknown money implementation gold" in unknown.stderr
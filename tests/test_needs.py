@@ -0,0 +1,27 @@
+import checkpoint
+from components import Needs, Need, ResourcePile, Resource
+from main import init, createFewEntities
+
+
+def test_people_share_one_profile_which_survives_checkpoints(tmp_path):
+    world = init(createFewEntities, ticker_path=None, seed=1)
+    profiles = {id(needs.profile) for _, needs in world.get_component(Needs) if needs.profile.name == "person"}
+    assert len(profiles) == 1
+
+    checkpoint.save(world, str(tmp_path / "checkpoint.bin"))
+    restored = checkpoint.load(init(lambda world: None, ticker_path=None), str(tmp_path / "checkpoint.bin"))
+    people = [needs for _, needs in restored.get_component(Needs) if needs.profile.name == "person"]
+    assert len({id(needs.profile) for needs in people}) == 1
+    assert [need.name for need in people[0]] == [need.name for need in people[0].profile.needs]
+
+
+def test_overridden_need_keeps_its_place_and_profile_stays_the_same():
+    shared = Needs()
+    shared.add(Need("eat", priority=2, pile=ResourcePile(Resource.FOOD), price_change_on_buy=1, price_change_on_failed_buy=1))
+    shared.add(Need("drink", priority=1, pile=ResourcePile(Resource.WATER), price_change_on_buy=1, price_change_on_failed_buy=1))
+    needs = Needs(shared.profile)
+    needs.override(Need("eat", priority=2, pile=ResourcePile(Resource.FOOD, 5), price_change_on_buy=1,
+                        price_change_on_failed_buy=1))
+
+    assert [(need.name, need.pile.amount) for need in needs] == [("drink", 1), ("eat", 5)]
+    assert [(need.name, need.pile.amount) for need in shared] == [("drink", 1), ("eat", 1)]
@@ -0,0 +1,62 @@
+from collections import Counter
+
+from hypothesis import given
+import hypothesis.strategies as st
+
+from components import Money, Resource, SellOrder, BuyOrder
+from order_book import OrderBook, pair_orders
+
+
+def pairs(buy_orders, sell_orders):
+    if len(sell_orders) < len(buy_orders):
+        return zip(buy_orders[len(buy_orders) - len(sell_orders):], sell_orders)
+    return zip(buy_orders, sell_orders[:len(buy_orders)])
+
+
+def match_by_dropping_one_buy_at_a_time(buy_orders, sell_orders):
+    if len(buy_orders) == 0 or len(sell_orders) == 0:
+        return []
+    max_buy = max(o.price for o in buy_orders)
+    min_sell = min(o.price for o in sell_orders)
+    eligible_sell = sorted([o for o in sell_orders if o.price <= max_buy], key=lambda o: o.price)
+    eligible_buy = sorted([o for o in buy_orders if o.price >= min_sell], key=lambda o: o.price)
+    while not all(buy.price >= sell.price for buy, sell in pairs(eligible_buy, eligible_sell)):
+        eligible_buy = eligible_buy[1:]
+    return list(pairs(eligible_buy, eligible_sell))
+
+
+def units_of(orders):
+    # one order per unit, as orders were placed before they could carry a quantity
+    return [order for order in orders for _ in range(order.amount)]
+
+
+orders = st.lists(st.tuples(st.integers(min_value=1, max_value=30), st.integers(min_value=1, max_value=5)), max_size=20)
+
+
+@given(buy_quotes=orders, sell_quotes=orders)
+def test_order_book_matches_same_units_as_quadratic_matching(buy_quotes, sell_quotes):
+    buy_orders = [BuyOrder(i, Resource.FOOD, Money(price), amount) for i, (price, amount) in enumerate(buy_quotes)]
+    sell_orders = [SellOrder(i, Resource.FOOD, Money(price), amount) for i, (price, amount) in enumerate(sell_quotes)]
+    books = OrderBook.for_orders(enumerate(buy_orders), enumerate(sell_orders))
+    expected = Counter((id(buy), id(sell)) for buy, sell in match_by_dropping_one_buy_at_a_time(units_of(buy_orders),
+                                                                                                units_of(sell_orders)))
+
+    if len(buy_orders) == 0 and len(sell_orders) == 0:
+        assert Resource.FOOD not in books
+    else:
+        fills = pair_orders(*books[Resource.FOOD].match_orders())
+        matched = Counter()
+        for fill in fills:
+            matched[(id(fill.buy_order), id(fill.sell_order))] += fill.amount
+        assert matched == expected
+
+
+def test_order_book_keeps_orders_of_different_resources_apart():
+    food = BuyOrder(1, Resource.FOOD, Money(10))
+    water = BuyOrder(2, Resource.WATER, Money(10), amount=3)
+    well = SellOrder(3, Resource.WATER, Money(5), amount=2)
+    books = OrderBook.for_orders([(1, food), (2, water)], [(3, well)])
+
+    assert books[Resource.FOOD].match_orders() == ([], [])
+    assert books[Resource.WATER].match_orders() == ([(water, 3)], [(well, 2)])
+    assert pair_orders(*books[Resource.WATER].match_orders()) == [(water, well, 2)]
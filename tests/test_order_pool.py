@@ -0,0 +1,20 @@
+from components import BuyOrder
+from globals import order_pool_for
+from main import init, createFewEntities
+
+
+def test_new_orders_reuse_entities_and_components_of_deleted_ones():
+    pooled = init(createFewEntities, ticker_path=None, seed=2)
+    not_pooled = init(createFewEntities, ticker_path=None, seed=2, order_pool_capacity=0)
+    pooled.process()
+    first_orders = {id(order) for _, order in pooled.get_component(BuyOrder)}
+    for _ in range(4):
+        pooled.process()
+    for _ in range(5):
+        not_pooled.process()
+
+    assert first_orders & {id(order) for _, order in pooled.get_component(BuyOrder)}
+    assert pooled._next_entity_id < not_pooled._next_entity_id
+    pooled._clear_dead_entities()
+    free = [ent for orders in order_pool_for(pooled).free.values() for ent, _ in orders]
+    assert len(free) > 0 and not any(ent in pooled._entities for ent in free)
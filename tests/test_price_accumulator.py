@@ -0,0 +1,26 @@
+import statistics
+
+from hypothesis import given, strategies as st
+
+from components import PriceAccumulator, Money, Resource, OrderType
+
+
+@given(st.lists(st.tuples(st.integers(min_value=1, max_value=1000), st.integers(min_value=1, max_value=5)),
+                min_size=1))
+def test_accumulated_stats_are_the_same_as_of_all_units(trades):
+    accumulator = PriceAccumulator()
+    for creds, amount in trades:
+        accumulator.add(Money(creds), amount)
+    units = sorted(creds for creds, amount in trades for _ in range(amount))
+
+    stat = accumulator.stat(Resource.FOOD, OrderType.TRANSACTION)
+    assert stat.length == len(units)
+    assert (stat.min.creds, stat.max.creds) == (units[0], units[-1])
+    assert stat.median.creds == statistics.median_low(units)
+    assert stat.p10.creds == units[int((len(units) - 1) * 0.1)]
+    assert stat.p90.creds == units[int((len(units) - 1) * 0.9)]
+
+
+def test_empty_accumulator_has_no_prices():
+    stat = PriceAccumulator().stat(Resource.FOOD, OrderType.BUY)
+    assert stat.length == 0 and stat.min is None and stat.median is None and stat.p90 is None
@@ -0,0 +1,55 @@
+import pytest
+from hypothesis import given, example, strategies as st
+
+from components import Storage, Producer, ResourcePile, Resource, Details
+from processors import possible_batches, Production
+
+# amounts in hundredths, most of them are not exact in binary
+units = st.integers(min_value=0, max_value=4000)
+producers = st.tuples(units, units, units, st.one_of(st.none(), units), units)
+
+
+def storage_and_producer(stored_input, stored_output, needed, limit, created):
+    storage = Storage()
+    storage.add(ResourcePile(Resource.FOOD, stored_input / 100))
+    if limit is not None:
+        storage.set_limit(ResourcePile(Resource.WATER, (stored_output + limit) / 100))
+    storage.add(ResourcePile(Resource.WATER, stored_output / 100))
+    return storage, Producer(ResourcePile(Resource.FOOD, needed / 100), ResourcePile(Resource.WATER, created / 100))
+
+
+def one_by_one(stored_input, stored_output, needed, limit, created) -> int:
+    # counted in whole hundredths, without rounding errors
+    batches = 0
+    while stored_input >= needed and (limit is None or created <= limit):
+        stored_input -= needed
+        if limit is not None:
+            limit -= created
+        batches += 1
+    return batches
+
+
+@given(producers)
+# 5.8 / 0.1 is 57.99999999999999
+@example((580, 0, 10, None, 1))
+def test_batches_are_the_same_as_when_produced_one_by_one(values):
+    storage, producer = storage_and_producer(*values)
+    if values[2] == 0 and (values[3] is None or values[4] == 0):
+        with pytest.raises(Exception):
+            possible_batches(storage, producer)
+    else:
+        batches = possible_batches(storage, producer)
+        assert batches == one_by_one(*values)
+        Production().produce(1, Details("producer"), storage, producer, batches)
+        assert storage.amount(Resource.FOOD) == pytest.approx((values[0] - batches * values[2]) / 100, abs=1e-9)
+
+
+@given(st.lists(producers, max_size=10))
+def test_vectorized_batches_are_the_same(values):
+    np = pytest.importorskip("numpy")
+    from vectorized_production import possible_batches_of
+    values = [v for v in values if not (v[2] == 0 and (v[3] is None or v[4] == 0))]
+    pairs = [storage_and_producer(*v) for v in values]
+    storages, producers = [s for s, _ in pairs], [p for _, p in pairs]
+    expected = [possible_batches(s, p) for s, p in pairs]
+    assert possible_batches_of(storages, producers).tolist() == expected
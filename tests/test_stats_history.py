@@ -0,0 +1,42 @@
+from components import StatsHistory, StarDate, Money, Resource
+
+
+def register(history, time, resource, price):
+    history.register_day_transactions(StarDate(time), resource, all_buy=[(Money(price + 1), 2)],
+                                      all_sell=[(Money(price - 1), 1)], fulfilled_buy=[(Money(price + 1), 1)],
+                                      fulfilled_sell=[(Money(price - 1), 1)], transactions=[(Money(price), 1)])
+
+
+def test_old_days_are_spilled_to_disk_and_still_found_by_range_queries(tmp_path):
+    history = StatsHistory(window=3, spill_path=str(tmp_path / "stats.bin"))
+    for time in range(1, 11):
+        register(history, time, Resource.FOOD, 10 * time)
+        register(history, time, Resource.WATER, time)
+
+    assert len(history.columns["time"]) == 6
+    assert not history.has_stats_for_day(StarDate(7), Resource.FOOD)
+    assert history.has_stats_for_day(StarDate(9), Resource.FOOD)
+    assert history.stats_for_day(StarDate(2), Resource.FOOD).transactions.median == Money(20)
+    food = history.stats_between(4, 9, Resource.FOOD)
+    assert [(stats.date.time, stats.transactions.median.creds) for stats in food] == [(t, 10 * t) for t in range(4, 10)]
+    assert food[0].buy_stats.length == 2 and food[0].sell_stats.max == Money(39)
+    assert len(history.stats_between(0, 100)) == 20
+
+
+def test_days_without_spill_file_are_forgotten():
+    history = StatsHistory(window=2)
+    for time in range(1, 5):
+        register(history, time, Resource.FOOD, time)
+    assert [stats.date.time for stats in history.stats_between(0, 10)] == [3, 4]
+
+
+def test_spill_file_cut_short_gives_the_days_left_in_it(tmp_path):
+    spill = tmp_path / "stats.bin"
+    history = StatsHistory(window=2, spill_path=str(spill))
+    for time in range(1, 6):
+        register(history, time, Resource.FOOD, time)
+    with open(spill, "r+b") as data:
+        data.truncate(len(data.read()) // 3)
+    assert [stats.date.time for stats in history.spilled_between(0, 10)] == [1]
+    open(spill, "wb").close()
+    assert history.spilled_between(0, 10) == []
@@ -0,0 +1,16 @@
+from sweep import parameter_grid, sweep
+
+
+def test_grid_has_every_combination():
+    assert parameter_grid({"tax_rate": [0, 0.1], "food_production": [1, 2, 3]}) == [
+        {"tax_rate": tax_rate, "food_production": production} for tax_rate in [0, 0.1] for production in [1, 2, 3]]
+
+
+def test_runs_of_same_seed_give_same_results_in_separate_processes():
+    parameters = {"tax_rate": [0.1, 0.1], "food_production": [2]}
+    results = list(sweep(parameters, agents=20, ticks=5, workers=2))
+    for result in results:
+        del result["seconds"]
+    assert len(results) == 2
+    assert results[0] == results[1]
+    assert {"gini", "top_10_share", "deaths", "people", "median_food"} <= results[0].keys()
@@ -0,0 +1,54 @@
+import gc
+import weakref
+
+from components import StatsHistory, StarDate, Money, Resource
+from main import init, createFewEntities
+from processors import TurnSummaryProcessor
+from runner import run_batch
+from transaction_logger import Ticker, read_binary_ticker
+
+
+def fill_history(ticker, days):
+    history = StatsHistory()
+    for time in range(1, days + 1):
+        history.register_day_transactions(StarDate(time), Resource.FOOD, all_buy=[(Money(time), 1)], all_sell=[],
+                                          fulfilled_buy=[], fulfilled_sell=[], transactions=[(Money(time), 1)])
+        ticker.log_transactions(history, StarDate(time), Resource.FOOD)
+        ticker.log_transactions(history, StarDate(time), Resource.WATER)
+
+
+def test_csv_rows_are_written_in_order_when_ticker_closes(tmp_path):
+    path = tmp_path / "ticker.csv"
+    ticker = Ticker(str(path), flush_interval=0.001)
+    fill_history(ticker, 20)
+    ticker.close()
+    with open(path) as saved:
+        lines = saved.read().splitlines()
+    assert [line.split(",")[5] for line in lines] == [str(time) for time in range(1, 21)]
+
+
+def test_binary_rows_are_read_back_as_stats(tmp_path):
+    path = str(tmp_path / "ticker.bin")
+    ticker = Ticker(path, "binary")
+    fill_history(ticker, 3)
+    ticker.flush()
+    stats = read_binary_ticker(path)
+    assert [(s.date.time, s.resource, s.transactions.median) for s in stats] == \
+           [(time, Resource.FOOD, Money(time)) for time in range(1, 4)]
+    ticker.close()
+
+
+def test_batch_run_closes_the_ticker_and_forgotten_tickers_are_freed(tmp_path):
+    path = str(tmp_path / "ticker.csv")
+    world = init(createFewEntities, ticker_path=path, seed=1)
+    ticker = world.get_processor(TurnSummaryProcessor).ticker
+    run_batch(world, 3)
+    assert ticker.ticker.closed and not ticker.writer.is_alive()
+    with open(path) as saved:
+        assert len(saved.read().splitlines()) > 0
+
+    forgotten = init(createFewEntities, ticker_path=str(tmp_path / "forgotten.csv"), seed=1)
+    forgotten_ticker = weakref.ref(forgotten.get_processor(TurnSummaryProcessor).ticker)
+    del forgotten
+    gc.collect()
+    assert forgotten_ticker() is None
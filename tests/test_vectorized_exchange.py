@@ -0,0 +1,55 @@
+from collections import Counter
+
+import esper
+import pytest
+from hypothesis import given
+import hypothesis.strategies as st
+
+from components import Money, Resource, SellOrder, BuyOrder, Wallet, Storage, OrderStatus
+from order_book import OrderBook, pair_orders
+
+np = pytest.importorskip("numpy")
+from vectorized_exchange import VectorizedExchange, sorted_by_price, match_units  # noqa: E402
+
+orders = st.lists(st.tuples(st.integers(min_value=1, max_value=30), st.integers(min_value=1, max_value=5)), max_size=20)
+
+
+@given(buy_quotes=orders, sell_quotes=orders)
+def test_vectorized_matching_fills_same_units_as_order_book(buy_quotes, sell_quotes):
+    buy_orders = [BuyOrder(i, Resource.FOOD, Money(price), amount) for i, (price, amount) in enumerate(buy_quotes)]
+    sell_orders = [SellOrder(i, Resource.FOOD, Money(price), amount) for i, (price, amount) in enumerate(sell_quotes)]
+    book = OrderBook.for_orders(enumerate(buy_orders), enumerate(sell_orders)).get(Resource.FOOD, OrderBook(Resource.FOOD))
+    expected = Counter()
+    for fill in pair_orders(*book.match_orders()):
+        expected[(id(fill.buy_order), id(fill.sell_order))] += fill.amount
+
+    sorted_buys, bid_prices, bid_units, _ = sorted_by_price(buy_orders)
+    sorted_sells, ask_prices, ask_units, _ = sorted_by_price(sell_orders)
+    _, _, _, bids, asks, units = match_units(bid_prices, bid_units, ask_prices, ask_units)
+    matched = Counter()
+    for b, a, u in zip(bids, asks, units):
+        matched[(id(sorted_buys[b]), id(sorted_sells[a]))] += int(u)
+    assert matched == expected
+
+
+def test_vectorized_exchange_settles_fills_in_bulk():
+    world = esper.World()
+    exchange = VectorizedExchange()
+    exchange.world = world
+    buyer, seller = world.create_entity(), world.create_entity()
+    for ent in (buyer, seller):
+        world.add_component(ent, Wallet(Money(0)))
+        world.add_component(ent, Storage())
+    # buyer locked 2x10cr + 1x20cr when ordering
+    cheap, expensive = BuyOrder(buyer, Resource.WATER, Money(10), 2), BuyOrder(buyer, Resource.WATER, Money(20))
+    sell = SellOrder(seller, Resource.WATER, Money(10), 3)
+    for order in (cheap, expensive, sell):
+        world.add_component(world.create_entity(), order)
+
+    exchange.process()
+
+    assert world.component_for_entity(buyer, Storage).amount(Resource.WATER) == 3
+    assert world.component_for_entity(buyer, Wallet).money.creds + world.component_for_entity(seller, Wallet).money.creds == 40
+    assert world.component_for_entity(seller, Wallet).money.creds in (35, 36)
+    assert (cheap.status, expensive.status, sell.status) == (OrderStatus.BOUGHT, OrderStatus.BOUGHT, OrderStatus.SOLD)
+    assert world.component_for_entity(seller, Wallet).last_transaction_details_for(Resource.WATER)[1] == OrderStatus.SOLD
@@ -0,0 +1,34 @@
+from components import RandomStream
+from globals import star_date_for, stats_history_for
+from main import init, createFewEntities
+
+
+def test_worlds_in_one_process_keep_their_own_date_and_prices():
+    first = init(createFewEntities, ticker_path=None)
+    second = init(createFewEntities, ticker_path=None)
+    for _ in range(3):
+        first.process()
+    second.process()
+
+    assert (star_date_for(first).time, star_date_for(second).time) == (3, 1)
+    assert stats_history_for(first) is not stats_history_for(second)
+    assert all(stats.date.time == 1 for stats in stats_history_for(second).stats_between(0, 3))
+
+
+def test_worlds_with_same_seed_are_the_same():
+    def prices(seed):
+        world = init(createFewEntities, ticker_path=None, seed=seed)
+        for _ in range(10):
+            world.process()
+        return [(stats.date.time, str(stats)) for stats in stats_history_for(world).stats_between(0, 10)]
+
+    assert prices(7) == prices(7)
+    assert prices(7) != prices(8)
+
+
+def test_substreams_depend_only_on_seed_and_key():
+    stream = RandomStream(3)
+    first = stream.substream(1).random()
+    stream.random()
+    assert stream.substream(1).random() == first
+    assert RandomStream(3).substream(2).random() != first
@@ -1,14 +1,82 @@
-import statistics
+import atexit
+import threading
+import weakref
+from functools import partial
+from array import array
+from typing import List
 
-import globals
+from components import StatsHistory, StarDate, StatsForDay, ROW, stats_to_row, stats_from_row
+
+TICKER_FORMATS = ["csv", "binary"]
 
 
 class Ticker:
+    # Rows are collected during ticks and written by a background thread every flush_interval seconds, so ticks never
+    # wait for the disk. Binary ticker has a row of len(ROW) int64 numbers for every resource and day, same as rows of
+    # StatsHistory, read it with read_binary_ticker.
+    def __init__(self, path: str = "ticker.csv", ticker_format: str = "csv", flush_interval: float = 1.0):
+        if ticker_format not in TICKER_FORMATS:
+            raise ValueError(f"Unknown ticker format {ticker_format}, use one of {TICKER_FORMATS}")
+        self.ticker_format = ticker_format
+        self.flush_interval = flush_interval
+        self.ticker = open(path, mode="w" if ticker_format == "csv" else "wb")
+        self.pending: List[StatsForDay] = []
+        self.lock = threading.Lock()
+        # rows are taken and written under one lock so that they are never written out of order
+        self.write_lock = threading.Lock()
+        self.closed = threading.Event()
+        # the writer thread and the exit hook only keep a weak reference, a ticker which is not closed does not keep
+        # its world alive
+        self.writer = threading.Thread(target=write_periodically, args=(weakref.ref(self), self.closed, flush_interval),
+                                       name=f"ticker {path}", daemon=True)
+        self.writer.start()
+        self.close_at_exit = partial(close_at_exit, weakref.ref(self))
+        atexit.register(self.close_at_exit)
+
+    def log_transactions(self, stats_history: StatsHistory, star_date: StarDate, resource_type):
+        if stats_history.has_stats_for_day(star_date, resource_type):
+            today_stats = stats_history.stats_for_day(star_date, resource_type)
+            with self.lock:
+                self.pending.append(today_stats)
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                rows, self.pending = self.pending, []
+            if len(rows) > 0 and not self.ticker.closed:
+                if self.ticker_format == "csv":
+                    self.ticker.write("".join(stats.as_csv() + "\n" for stats in rows))
+                else:
+                    array("q", [value for stats in rows for value in stats_to_row(stats)]).tofile(self.ticker)
+                self.ticker.flush()
+
+    def close(self):
+        # writes everything that is left, called at exit at the latest
+        if not self.closed.is_set():
+            self.closed.set()
+            self.writer.join()
+            self.flush()
+            self.ticker.close()
+            atexit.unregister(self.close_at_exit)
+
+
+def write_periodically(ticker_ref, closed: threading.Event, flush_interval: float):
+    while not closed.wait(flush_interval):
+        ticker = ticker_ref()
+        if ticker is None:
+            return
+        ticker.flush()
+        del ticker
+
+
+def close_at_exit(ticker_ref):
+    ticker = ticker_ref()
+    if ticker is not None:
+        ticker.close()
 
-    def __init__(self):
-        self.ticker = open("ticker.csv", mode="w")
 
-    def log_transactions(self, resource_type):
-        if globals.stats_history.has_stats_for_day(globals.star_date, resource_type):
-            today_stats = globals.stats_history.stats_for_day(globals.star_date, resource_type)
-            self.ticker.write(today_stats.as_csv()+"\n")
+def read_binary_ticker(path: str) -> List[StatsForDay]:
+    values = array("q")
+    with open(path, "rb") as ticker:
+        values.frombytes(ticker.read())
+    return [stats_from_row(values[i:i + len(ROW)].tolist()) for i in range(0, len(values), len(ROW))]
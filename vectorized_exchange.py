@@ -0,0 +1,156 @@
+from typing import Dict
+
+from components import Resource, Money, Wallet, Storage, ResourcePile, OrderStatus, MarketStats
+from ledger import ledger_for
+from log import log, event, events_enabled
+from order_book import without_lowest_units
+from processors import Exchange, print_total_money
+from instrumentation import count
+from globals import star_date_for, stats_history_for, random_for
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:
+    np = None
+
+
+class OrderColumns:
+    def __init__(self, resource: Resource):
+        self.resource = resource
+        self.buy_orders = []
+        self.sell_orders = []
+
+    @staticmethod
+    def for_orders(buy_orders, sell_orders) -> Dict[Resource, 'OrderColumns']:
+        columns: Dict[Resource, OrderColumns] = {}
+        for _, order in buy_orders:
+            if order.resource not in columns:
+                columns[order.resource] = OrderColumns(order.resource)
+            if order.remaining() > 0:
+                columns[order.resource].buy_orders.append(order)
+        for _, order in sell_orders:
+            if order.resource not in columns:
+                columns[order.resource] = OrderColumns(order.resource)
+            if order.remaining() > 0:
+                columns[order.resource].sell_orders.append(order)
+        return columns
+
+
+def sorted_by_price(orders):
+    # orders with the same price keep their order, same as in the OrderBook
+    prices = np.fromiter((o.price.creds for o in orders), dtype=np.int64, count=len(orders))
+    units = np.fromiter((o.remaining() for o in orders), dtype=np.int64, count=len(orders))
+    owners = np.fromiter((o.owner for o in orders), dtype=np.int64, count=len(orders))
+    by_price = np.argsort(prices, kind="stable")
+    return [orders[i] for i in by_price], prices[by_price], units[by_price], owners[by_price]
+
+
+def match_units(bid_prices, bid_units, ask_prices, ask_units):
+    # Vectorized version of OrderBook.match_orders followed by pair_orders, all arrays are sorted by price.
+    # Returns index of the first eligible bid, number of eligible asks, number of cheapest eligible bid units left
+    # unpaired and (bid index, ask index, units) arrays describing every fill.
+    nothing = np.zeros(0, dtype=np.int64)
+    if len(bid_prices) == 0 or len(ask_prices) == 0 or bid_prices[-1] < ask_prices[0]:
+        return len(bid_prices), 0, 0, nothing, nothing, nothing
+    first_bid = int(np.searchsorted(bid_prices, ask_prices[0], "left"))
+    asks = int(np.searchsorted(ask_prices, bid_prices[-1], "right"))
+    bp, bu, ap, au = bid_prices[first_bid:], bid_units[first_bid:], ask_prices[:asks], ask_units[:asks]
+
+    bid_ends, ask_ends = np.cumsum(bu), np.cumsum(au)
+    ask_starts = ask_ends - au
+    n, m = int(bid_ends[-1]), int(ask_ends[-1])
+    # ask unit j paired with bid unit offset + j is valid only if offset + j skips all bid units cheaper than the ask
+    cheaper_bids = np.concatenate(([0], bid_ends))[np.searchsorted(bp, ap, "left")]
+    required_offset = np.maximum.accumulate(cheaper_bids - ask_starts)
+    lowest = max(0, n - m)
+    offsets = np.arange(lowest, n + 1)
+    paired_asks = np.searchsorted(ask_starts, n - offsets, "left")
+    valid = (paired_asks == 0) | (required_offset[np.maximum(paired_asks - 1, 0)] <= offsets)
+    offset = lowest + int(np.argmax(valid))
+    dropped = 0 if offset == lowest else offset
+
+    paired = n - offset
+    breaks = np.unique(np.concatenate((bid_ends[:-1] - offset, ask_starts)))
+    breaks = breaks[(breaks >= 0) & (breaks < paired)]
+    units = np.diff(np.append(breaks, paired))
+    bids = first_bid + np.searchsorted(bid_ends, breaks + offset, "right")
+    asks_filled = np.searchsorted(ask_ends, breaks, "right")
+    return first_bid, asks, dropped, bids, asks_filled, units
+
+
+def transaction_prices(buy_prices, sell_prices, rng):
+    # Money.split of buy and sell price for every fill, the odd penny goes to either side at random
+    totals = buy_prices + sell_prices
+    return totals // 2 + np.where(rng.random(len(totals)) < 0.5, totals % 2, 0)
+
+
+def totals_per_owner(owners, values):
+    unique, inverse = np.unique(owners, return_inverse=True)
+    totals = np.zeros(len(unique), dtype=np.int64)
+    np.add.at(totals, inverse, values)
+    return zip(unique.tolist(), totals.tolist())
+
+
+def last_per_owner(owners, values):
+    unique, index = np.unique(owners[::-1], return_index=True)
+    return zip(unique.tolist(), values[len(owners) - 1 - index].tolist())
+
+
+class VectorizedExchange(Exchange):
+    def __init__(self):
+        super().__init__()
+        if np is None:
+            raise ImportError("VectorizedExchange needs numpy, install it with: pip install numpy")
+
+    def collect_orders(self, buy_orders, sell_orders) -> Dict[Resource, OrderColumns]:
+        return OrderColumns.for_orders(buy_orders, sell_orders)
+
+    def clear_market(self, resource_type: Resource, columns: OrderColumns):
+        log.debug("Processing orders for %s", resource_type)
+        buy_orders, bid_prices, bid_units, buyers = sorted_by_price(columns.buy_orders)
+        sell_orders, ask_prices, ask_units, sellers = sorted_by_price(columns.sell_orders)
+        first_bid, asks, dropped, bids_filled, asks_filled, units = match_units(bid_prices, bid_units, ask_prices,
+                                                                                ask_units)
+        count(self, "orders", len(buy_orders) + len(sell_orders))
+        count(self, "fills", len(units))
+        prices = transaction_prices(bid_prices[bids_filled], ask_prices[asks_filled],
+                                    np.random.default_rng(random_for(self.world).getrandbits(64)))
+
+        ledger = ledger_for(self.world)
+        for seller, creds in totals_per_owner(sellers[asks_filled], prices * units):
+            ledger.release(self.world.component_for_entity(seller, Wallet), Money(creds))
+        # buyers get a refund from what they payed upfront when creating orders
+        for buyer, creds in totals_per_owner(buyers[bids_filled], (bid_prices[bids_filled] - prices) * units):
+            ledger.release(self.world.component_for_entity(buyer, Wallet), Money(creds))
+        for buyer, bought in totals_per_owner(buyers[bids_filled], units):
+            self.world.component_for_entity(buyer, Storage).add(ResourcePile(resource_type, bought))
+        for seller, price in last_per_owner(sellers[asks_filled], prices):
+            self.world.component_for_entity(seller, Wallet).register_transaction(resource_type, Money(price),
+                                                                                 OrderStatus.SOLD)
+        for buyer, price in last_per_owner(buyers[bids_filled], prices):
+            self.world.component_for_entity(buyer, Wallet).register_transaction(resource_type, Money(price),
+                                                                                OrderStatus.BOUGHT)
+        for i, filled in totals_per_owner(bids_filled, units):
+            buy_orders[i].fill(filled)
+        for i, filled in totals_per_owner(asks_filled, units):
+            sell_orders[i].fill(filled)
+        log.debug("%s units of %s traded in %s fills", units.sum(), resource_type, len(units))
+        print_total_money(self.world, "After orders where processed")
+
+        eligible_buy = without_lowest_units(list(zip(buy_orders[first_bid:], bid_units[first_bid:].tolist())), dropped)
+        star_date = star_date_for(self.world)
+        market = MarketStats(star_date, resource_type)
+        for order in buy_orders:
+            market.add("buy_stats", order.price, order.amount)
+        for order in sell_orders:
+            market.add("sell_stats", order.price, order.amount)
+        for order, filled in eligible_buy:
+            market.add("fulfilled_buy", order.price, filled)
+        for order, filled in zip(sell_orders[:asks], ask_units[:asks].tolist()):
+            market.add("fulfilled_sell", order.price, filled)
+        for price, filled in zip(prices.tolist(), units.tolist()):
+            market.add("transactions", Money(price), filled)
+        stats_history_for(self.world).register_day(market.stats_for_day())
+        if events_enabled():
+            event("market", date=star_date.time, resource=resource_type.name, bids=len(buy_orders),
+                  asks=len(sell_orders), fills=len(units), units=int(units.sum()))
@@ -0,0 +1,58 @@
+from typing import List
+
+from components import Details, Storage, Producer, NO_LIMIT
+from instrumentation import count
+from log import log, debug_enabled
+from processors import Production, BATCH_TOLERANCE
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:
+    np = None
+
+
+def possible_batches_of(storages: List[Storage], producers: List[Producer]):
+    # same as processors.possible_batches for all producers at once
+    n = len(producers)
+    needed_slots = np.fromiter((p.needed_pile().resource_type.slot for p in producers), dtype=np.int64, count=n)
+    created_slots = np.fromiter((p.created_pile().resource_type.slot for p in producers), dtype=np.int64, count=n)
+    if (needed_slots == created_slots).any():
+        raise Exception("Producers cannot need the same resource they create")
+    needed = np.fromiter((p.needed_pile().amount for p in producers), dtype=np.float64, count=n)
+    created = np.fromiter((p.created_pile().amount for p in producers), dtype=np.float64, count=n)
+    stored_in = np.fromiter((s.stored[slot] for s, slot in zip(storages, needed_slots.tolist())), dtype=np.float64,
+                            count=n)
+    stored_out = np.fromiter((s.stored[slot] for s, slot in zip(storages, created_slots.tolist())), dtype=np.float64,
+                             count=n)
+    limits = np.fromiter((s.limits[slot] for s, slot in zip(storages, created_slots.tolist())), dtype=np.float64,
+                         count=n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        by_input = np.where(needed > 0, np.floor(stored_in / needed + BATCH_TOLERANCE), np.inf)
+        by_space = np.where((created > 0) & (limits != NO_LIMIT),
+                            np.floor((limits - stored_out) / created + BATCH_TOLERANCE), np.inf)
+    batches = np.minimum(by_input, by_space)
+    if np.isinf(batches).any():
+        raise Exception("Some producers would never stop")
+    return np.maximum(batches, 0).astype(np.int64)
+
+
+class VectorizedProduction(Production):
+    # batches of all producers are computed at once, only producers which make something are visited afterwards
+    def __init__(self):
+        super().__init__()
+        if np is None:
+            raise ImportError("VectorizedProduction needs numpy, install it with: pip install numpy")
+
+    def process(self):
+        log.debug("\nProduction Phase started")
+        producers = self.world.get_components(Details, Storage, Producer)
+        if len(producers) == 0:
+            return
+        batches = possible_batches_of([storage for _, (_, storage, _) in producers],
+                                      [producer for _, (_, _, producer) in producers])
+        # producers without batches only log why, which is not needed without debug
+        producing = range(len(producers)) if debug_enabled() else np.flatnonzero(batches).tolist()
+        for i in producing:
+            ent, (details, storage, producer) = producers[i]
+            self.produce(ent, details, storage, producer, int(batches[i]))
+        count(self, "batches", int(batches.sum()))